@@ -2,8 +2,9 @@ import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
 from datetime import datetime
+from utils.anomaly_detection import render_alerts
 from utils.data_generator import generate_sample_data
-from utils.kpi_calculator import calculate_all_kpis
+from utils.kpi_calculator import calculate_kpis
 
 # Configuration de la page avec thème personnalisé
 st.set_page_config(
@@ -137,13 +138,13 @@ def main():
 
         # Generate sample data and get industry-specific KPIs
         current_data = generate_sample_data()
-        kpis = calculate_all_kpis(current_data)
+        kpis = calculate_kpis(current_data, ['efficacite_energetique', 'rendement_matiere', 'taux_conformite'])
         industry_kpis = get_industry_kpis(selected_industry)
 
         # Create gauge chart for overall efficiency
         fig = go.Figure(go.Indicator(
             mode = "gauge+number",
-            value = kpis['performance_energetique']['efficacite_energetique'],
+            value = kpis['efficacite_energetique'],
             title = {'text': "Efficacité Globale"},
             domain = {'x': [0, 1], 'y': [0, 1]},
             gauge = {
@@ -163,9 +164,9 @@ def main():
         df_kpis = pd.DataFrame({
             'KPI': ['Efficacité Énergétique', 'Rendement Matière', 'Qualité'],
             'Valeur': [
-                kpis['performance_energetique']['efficacite_energetique'],
-                kpis['rendement_production']['rendement_matiere'],
-                kpis['qualite_production']['taux_conformite']
+                kpis['efficacite_energetique'],
+                kpis['rendement_matiere'],
+                kpis['taux_conformite']
             ]
         })
 
@@ -184,16 +185,8 @@ def main():
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         st.info(f"Dernière mise à jour: {current_time}")
 
-        # Sample alerts based on industry
-        if selected_industry == "Pétrole et Gaz":
-            st.warning("⚠️ Pression du système au-dessus du seuil normal")
-            st.success("✅ Qualité du produit conforme aux spécifications")
-        elif selected_industry == "Agroalimentaire":
-            st.warning("⚠️ Température de stockage proche de la limite")
-            st.success("✅ Traçabilité des lots validée")
-        else:
-            st.warning("⚠️ Maintenance préventive requise sur ligne 2")
-            st.success("✅ Tests de qualité conformes aux normes GMP")
+        # Alerts computed from the sensor readings
+        render_alerts(selected_unit)
 
     # Description des fonctionnalités
     st.markdown("""
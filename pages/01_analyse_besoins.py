@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime
 import io
+from utils.kpi_calculator import kpis_from_labels, unsupported_labels
 
 st.set_page_config(page_title="Analyse des Besoins", page_icon="📊")
 
@@ -14,8 +15,16 @@ if 'custom_industries' not in st.session_state:
         'Pharmaceutique': {}
     }
 
+# KPIs to compute and store for each unit, filled by save_configuration
+if 'unit_kpis' not in st.session_state:
+    st.session_state.unit_kpis = {}
+
 def save_configuration(selected_industry, selected_unit, selected_needs, selected_sources, selected_frequency, selected_kpis):
     """Sauvegarder la configuration actuelle"""
+    # Only the selected KPIs will be computed for this unit
+    computed_kpis = kpis_from_labels(selected_kpis)
+    st.session_state.unit_kpis[selected_unit] = computed_kpis
+
     config_data = {
         'industry_type': selected_industry,
         'unit': selected_unit,
@@ -23,6 +32,7 @@ def save_configuration(selected_industry, selected_unit, selected_needs, selecte
         'data_sources': ', '.join(selected_sources),
         'frequency': selected_frequency,
         'kpis': ', '.join(selected_kpis),
+        'computed_kpis': ', '.join(computed_kpis),
         'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
@@ -231,6 +241,9 @@ def render_analyse_besoins():
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
+        unsupported = unsupported_labels(selected_kpis)
+        if unsupported:
+            st.warning(f"KPIs non pris en charge par le calcul : {', '.join(unsupported)}")
         st.success("Configuration sauvegardée avec succès!")
 
 if __name__ == "__main__":
@@ -2,7 +2,10 @@ import streamlit as st
 import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime, timedelta
-from utils.simulation import ProcessSimulator
+from utils.calibration import CALIBRATION_STORE
+from utils.data_assimilation import EnsembleKalmanFilter
+from utils.monte_carlo import MonteCarloRunner, relative_uncertainty
+from utils.simulation import PROCESS_KPIS, ProcessSimulator
 import pandas as pd
 
 st.set_page_config(page_title="Jumeau Numérique", page_icon="🔄")
@@ -37,6 +40,157 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def plot_uncertainty_band(progress):
+    """Tracer la médiane et la bande 5 %-95 % de la température"""
+    time_hours = progress['time'] / 3600
+    band = progress['quantiles']['temperature']
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=time_hours, y=band[0.95], line={'width': 0}, showlegend=False))
+    fig.add_trace(go.Scatter(
+        x=time_hours, y=band[0.05], fill='tonexty', line={'width': 0},
+        fillcolor='rgba(0, 102, 204, 0.2)', name="Intervalle 5 %-95 %"
+    ))
+    fig.add_trace(go.Scatter(x=time_hours, y=band[0.5], line={'color': '#0066cc'}, name="Médiane"))
+    fig.update_layout(
+        title="Évolution de la Température (incertitude)",
+        xaxis_title="Temps (heures)",
+        yaxis_title="Température (°C)"
+    )
+    return fig
+
+def plot_kpi_gauge(kpi_name, value, band=None):
+    """Jauge d'un KPI, avec l'intervalle 5 %-95 % de l'analyse Monte Carlo s'il est connu"""
+    steps = [
+        {'range': [0, 60], 'color': "lightgray"},
+        {'range': [60, 80], 'color': "gray"},
+        {'range': [80, 100], 'color': "darkgray"}
+    ]
+    if band is not None:
+        steps.append({'range': list(band), 'color': "rgba(255, 127, 14, 0.6)"})
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = value,
+        title = {'text': kpi_name.replace('_', ' ').title()},
+        gauge = {
+            'axis': {'range': [None, 100]},
+            'bar': {'color': "#0066cc"},
+            'steps': steps
+        }
+    ))
+    fig.update_layout(height=200)
+    return fig
+
+def render_uncertainty_analysis(parameters, duration):
+    """Analyse Monte Carlo de la simulation autour des paramètres saisis"""
+    st.subheader("Analyse d'Incertitude (Monte Carlo)")
+    col1, col2 = st.columns(2)
+    with col1:
+        n_scenarios = st.number_input("Nombre de scénarios", 1000, 200000, 20000, step=1000)
+    with col2:
+        relative_std = st.slider("Incertitude sur les paramètres (%)", 1, 30, 5) / 100
+
+    if st.button("Lancer l'analyse Monte Carlo"):
+        runner = MonteCarloRunner(relative_uncertainty(parameters, relative_std), n_scenarios, duration=duration)
+        progress_bar = st.progress(0.0)
+        chart = st.empty()
+        progress = None
+        for progress in runner.run():
+            progress_bar.progress(progress['completed'] / progress['total'],
+                                  text=f"{progress['completed']} / {progress['total']} scénarios")
+            chart.plotly_chart(plot_uncertainty_band(progress))
+
+        if progress is not None and progress['quantiles']:
+            # KPI medians with their 5 %-95 % interval, kept for the gauges of the simulation
+            bands = {name: (progress['quantiles'][name][0.05][0], progress['quantiles'][name][0.95][0])
+                     for name in PROCESS_KPIS}
+            st.session_state.kpi_bands = {'key': (sorted(parameters.items()), duration), 'bands': bands}
+            columns = st.columns(len(PROCESS_KPIS))
+            for column, name in zip(columns, PROCESS_KPIS):
+                with column:
+                    st.plotly_chart(plot_kpi_gauge(name, progress['quantiles'][name][0.5][0], bands[name]))
+                    st.caption(f"Intervalle 5 %-95 % : {bands[name][0]:.1f} - {bands[name][1]:.1f}")
+
+def plot_temperature(time, temperature):
+    """Tracer l'évolution de la température"""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=time/3600, y=temperature, name="Température"))
+    fig.update_layout(
+        title="Évolution de la Température",
+        xaxis_title="Temps (heures)",
+        yaxis_title="Température (°C)"
+    )
+    return fig
+
+def stream_simulation(simulator, parameters, duration, chart, tolerance=0.05):
+    """
+    Simulation longue par segments : chaque segment est décimé, stocké en
+    float32 et ajouté au graphique dès qu'il est calculé
+    """
+    times, temperatures = [], []
+    for segment in simulator.iter_simulation(parameters, duration, tolerance=tolerance):
+        times.append(segment['time'])
+        temperatures.append(segment['temperature'])
+        chart.plotly_chart(plot_temperature(np.concatenate(times), np.concatenate(temperatures)))
+    return {
+        'time': np.concatenate(times),
+        'temperature': np.concatenate(temperatures),
+        'energy_consumption': segment['energy_consumption'],
+        'product_output': segment['product_output'],
+        'setpoint': segment['setpoint'],
+        'decimated': True
+    }
+
+def render_data_assimilation(simulator, parameters):
+    """
+    Suivi en temps réel de la température mesurée par filtre de Kalman d'ensemble
+    Les relevés (un par minute, temps de séjour d'une heure au débit nominal) sont
+    simulés à partir des paramètres saisis, avec un échelon de +5 °C de la
+    température d'entrée, non mesurée, que le filtre estime.
+    """
+    st.subheader("Assimilation de Données (Filtre de Kalman d'Ensemble)")
+    col1, col2 = st.columns(2)
+    with col1:
+        n_members = st.number_input("Membres de l'ensemble", 50, 2000, 200, step=50)
+    with col2:
+        measurement_std = st.number_input("Bruit du capteur (°C)", 0.05, 5.0, 0.3)
+
+    if st.button("Lancer le suivi"):
+        n_steps, dt = 600, 60.0
+        rng = np.random.default_rng()
+        inlet = np.where(np.arange(n_steps) < n_steps // 2, parameters['inlet_temperature'],
+                         parameters['inlet_temperature'] + 5.0)
+        true_temperature = np.empty(n_steps)
+        temperature = parameters['temperature']
+        for i in range(n_steps):
+            temperature = simulator.analytical_temperature(dt, temperature, parameters['heat_input'],
+                                                           inlet[i], parameters['flow_rate'])
+            true_temperature[i] = temperature
+        measurements = true_temperature + rng.normal(0, measurement_std, n_steps)
+
+        enkf = EnsembleKalmanFilter(simulator, n_members=n_members, estimate=('inlet_temperature',),
+                                   initial=parameters, initial_std={'inlet_temperature': 5.0},
+                                   process_std={'inlet_temperature': 0.1}, measurement_std=measurement_std)
+        history = enkf.run(measurements[:, None], dt=dt)
+
+        minutes = np.arange(1, n_steps + 1) * dt / 60
+        mean, std = (values[:, 0] for values in history['inlet_temperature'])
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=minutes, y=measurements, mode='markers', marker={'size': 3},
+                                 name="Température mesurée"))
+        fig.add_trace(go.Scatter(x=minutes, y=history['temperature'][0][:, 0], name="Température estimée"))
+        fig.add_trace(go.Scatter(x=minutes, y=mean + 2 * std, line={'width': 0}, showlegend=False))
+        fig.add_trace(go.Scatter(x=minutes, y=mean - 2 * std, fill='tonexty', line={'width': 0},
+                                 fillcolor='rgba(255, 127, 14, 0.2)', showlegend=False))
+        fig.add_trace(go.Scatter(x=minutes, y=mean, name="Température d'entrée estimée"))
+        fig.add_trace(go.Scatter(x=minutes, y=inlet, line={'dash': 'dot'}, name="Température d'entrée réelle"))
+        fig.update_layout(title="Suivi de la Température", xaxis_title="Temps (min)", yaxis_title="Température (°C)")
+        st.plotly_chart(fig)
+
+        latency = enkf.latency()
+        st.write(f"Latence par pas : moyenne {latency['mean_ms']:.2f} ms, "
+                 f"95e centile {latency['p95_ms']:.2f} ms, max {latency['max_ms']:.2f} ms "
+                 f"({latency['steps']} pas)")
+
 def render_digital_twin():
     st.title("🔄 Jumeau Numérique")
 
@@ -72,21 +226,23 @@ def render_digital_twin():
     # Simulation duration
     duration = st.selectbox(
         "Durée de simulation",
-        [1, 2, 4, 8, 12, 24],
-        format_func=lambda x: f"{x} heures"
+        [1, 2, 4, 8, 12, 24, 168, 336, 672],
+        format_func=lambda x: f"{x} heures" if x <= 24 else f"{x // 168} semaine(s)"
     ) * 3600
 
-    # Initialize simulator
-    simulator = ProcessSimulator()
+    # Initialize simulator (with the constants calibrated for a unit, if any)
+    calibrated_units = CALIBRATION_STORE.units()
+    unit = None
+    if calibrated_units:
+        unit = st.selectbox("Paramètres du modèle", [None] + calibrated_units,
+                            format_func=lambda u: "Nominaux" if u is None else f"Calibrés - {u}")
+    simulator = CALIBRATION_STORE.simulator(unit) if unit else ProcessSimulator()
 
     if st.button("Lancer la Simulation"):
         # Start timer
         if not st.session_state.start_time:
             st.session_state.start_time = datetime.now()
 
-        # Run simulation
-        results = simulator.simulate_process(parameters, duration)
-
         # Display timer
         st.markdown("<div class='timer'>", unsafe_allow_html=True)
         elapsed = datetime.now() - st.session_state.start_time
@@ -98,41 +254,22 @@ def render_digital_twin():
         col1, col2 = st.columns(2)
 
         with col1:
-            # Temperature evolution
-            fig_temp = go.Figure()
-            fig_temp.add_trace(go.Scatter(
-                x=results['time']/3600,
-                y=results['temperature'],
-                name="Température"
-            ))
-            fig_temp.update_layout(
-                title="Évolution de la Température",
-                xaxis_title="Temps (heures)",
-                yaxis_title="Température (°C)"
-            )
-            st.plotly_chart(fig_temp)
+            # Temperature evolution (long horizons are streamed segment by segment)
+            chart = st.empty()
+            if duration > 24 * 3600:
+                results = stream_simulation(simulator, parameters, duration, chart)
+            else:
+                results = simulator.simulate_process(parameters, duration)
+                chart.plotly_chart(plot_temperature(results['time'], results['temperature']))
 
         with col2:
-            # KPI predictions
+            # KPI predictions, with the Monte Carlo interval of the same parameters and horizon if any
             kpis = simulator.predict_kpis(results)
+            saved = st.session_state.get('kpi_bands')
+            bands = saved['bands'] if saved and saved['key'] == (sorted(parameters.items()), duration) else {}
 
             for kpi_name, value in kpis.items():
-                fig = go.Figure(go.Indicator(
-                    mode = "gauge+number",
-                    value = value,
-                    title = {'text': kpi_name.replace('_', ' ').title()},
-                    gauge = {
-                        'axis': {'range': [None, 100]},
-                        'bar': {'color': "#0066cc"},
-                        'steps': [
-                            {'range': [0, 60], 'color': "lightgray"},
-                            {'range': [60, 80], 'color': "gray"},
-                            {'range': [80, 100], 'color': "darkgray"}
-                        ]
-                    }
-                ))
-                fig.update_layout(height=200)
-                st.plotly_chart(fig)
+                st.plotly_chart(plot_kpi_gauge(kpi_name, value, bands.get(kpi_name)))
 
         # Additional metrics with export option
         st.subheader("Métriques de Performance")
@@ -154,5 +291,10 @@ def render_digital_twin():
             mime="text/csv"
         )
 
+    render_data_assimilation(simulator, parameters)
+
+    # The Monte Carlo histograms grow with the number of time points: horizon capped at 24 h
+    render_uncertainty_analysis(parameters, min(duration, 24 * 3600))
+
 if __name__ == "__main__":
     render_digital_twin()
\ No newline at end of file
@@ -2,227 +2,156 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-import io
+import os
 from datetime import datetime
-from utils.data_generator import generate_historical_data
-from utils.kpi_calculator import calculate_all_kpis
+from utils.downsampling import downsample_frame
+from utils.export import EXPORT_CACHE, EXPORT_FORMATS, dataset_version
+from utils.kpi_aggregator import DEFAULT_WINDOWS, RollingKPIAggregator
+from utils.kpi_calculator import KPI_CATEGORIES, KPI_REGISTRY, compile_kpi_plan, evaluate_kpi_plan
+from utils.timeseries_store import TimeSeriesStore, load_history
 
 st.set_page_config(page_title="Monitoring KPI", page_icon="📈")
 
-def export_kpi_data(kpi_data, category):
-    """Export KPI data to Excel with multiple sheets"""
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-        # Données brutes
-        kpi_data.to_excel(writer, sheet_name='Données brutes', index=False)
-
-        # Statistiques
-        stats = kpi_data.describe()
-        stats.to_excel(writer, sheet_name='Statistiques')
-
-        # Dernière valeur
-        latest = kpi_data.iloc[-1:].T
-        latest.to_excel(writer, sheet_name='Dernier relevé')
+# History of the readings (hourly data, one partition per month), persisted only
+# when HISTORY_STORE_DIR is set
+HISTORY_STORE = TimeSeriesStore(os.environ.get('HISTORY_STORE_DIR'), partition='month')
+
+# Tab title, chart title and export name of every KPI category
+CATEGORY_TABS = {
+    'performance_energetique': ("Performance Énergétique", "Évolution de la Performance Énergétique",
+                                "Performance_Energetique"),
+    'rendement_production': ("Rendement Production", "Évolution du Rendement de Production", "Rendement_Production"),
+    'qualite_production': ("Qualité Production", "Évolution des Métriques de Qualité", "Qualite_Production"),
+    'maintenance': ("Maintenance", "Évolution des Métriques de Maintenance", "Maintenance"),
+    'environnement': ("Environnement", "Évolution des Métriques Environnementales", "Environnement"),
+    'couts': ("Coûts", "Évolution des Coûts", "Coûts")
+}
+
+# KPIs of the global export (those computed for the unit)
+GLOBAL_EXPORT_KPIS = ('efficacite_energetique', 'rendement_matiere', 'taux_conformite', 'mtbf', 'emissions_co2',
+                      'cout_unitaire')
+
+def render_export(kpi_data, category, file_prefix, version, label="📊 Exporter"):
+    """Exporter les données à la demande, le fichier n'étant généré qu'une fois par version des données"""
+    col1, col2 = st.columns(2)
+    with col1:
+        export_format = st.selectbox(
+            "Format d'export",
+            list(EXPORT_FORMATS),
+            format_func=lambda x: {'xlsx': "Excel", 'csv.gz': "CSV compressé", 'parquet': "Parquet"}[x],
+            key=f"format_{category}"
+        )
 
-    return buffer.getvalue()
+    key = (category, version, export_format)
+    path = EXPORT_CACHE.get(key)
+    with col2:
+        if path is None and st.button("⚙️ Préparer l'export", key=f"prepare_{category}"):
+            with st.spinner("Génération du fichier..."):
+                path = EXPORT_CACHE.build(key, kpi_data, export_format)
+
+        if path is not None:
+            extension, mime = EXPORT_FORMATS[export_format]
+            with open(path, 'rb') as export_file:
+                st.download_button(
+                    label=label,
+                    data=export_file,
+                    file_name=f"{file_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                    mime=mime,
+                    key=f"download_{category}"
+                )
+
+def plot_kpi_trend(data, columns, title, visible_range, max_points, mode):
+    """Tracer l'évolution des KPIs sur la plage visible, avec un nombre de points limité"""
+    chart_data = downsample_frame(data, 'timestamp', columns, max_points, mode, *visible_range)
+    fig = px.line(chart_data, x='timestamp', y='value', color='variable', title=title)
+    st.plotly_chart(fig)
+
+def render_rolling_statistics(df, unit, kpis):
+    """
+    Statistiques glissantes des KPIs (1h à 30 jours)
+    L'agrégateur est conservé dans la session et ne reçoit que les relevés plus
+    récents que ceux déjà agrégés.
+    """
+    st.subheader("Statistiques Glissantes")
+    aggregators = st.session_state.setdefault('kpi_aggregators', {})
+    key = (unit, tuple(kpis))
+    if key not in aggregators:
+        aggregators[key] = RollingKPIAggregator(kpis=kpis)
+    aggregator = aggregators[key]
+    new_rows = df if aggregator.last_timestamp is None else df[df.index > aggregator.last_timestamp]
+    aggregator.update_frame(new_rows)
+
+    window = st.selectbox("Fenêtre", list(DEFAULT_WINDOWS), index=2)
+    statistics = aggregator.snapshot(df.index[-1])[window]
+    statistics.index = [KPI_REGISTRY[name]['label'] for name in statistics.index]
+    st.dataframe(statistics.rename(columns={'count': "Relevés", 'mean': "Moyenne", 'std': "Écart-type",
+                                            'min': "Min", 'max': "Max", 'p50': "Médiane", 'p95': "P95"}))
 
 def render_kpi_monitoring():
     st.title("📈 Monitoring des KPI")
 
-    # Get historical data
-    historical_data = generate_historical_data(30)  # 30 days of data
-
-    # Convert to DataFrame
-    df = pd.DataFrame(historical_data)
-
-    # Calculate KPIs for each timestamp
-    kpis_over_time = []
-    for _, row in df.iterrows():
-        kpis = calculate_all_kpis(row)
-        kpis['timestamp'] = row['timestamp']
-        kpis_over_time.append(kpis)
-
-    # Create tabs for different KPI categories
-    tabs = st.tabs([
-        "Performance Énergétique",
-        "Rendement Production",
-        "Qualité Production",
-        "Maintenance",
-        "Environnement",
-        "Coûts"
-    ])
-
-    with tabs[0]:
-        st.subheader("Performance Énergétique")
-
-        # Energy efficiency trend
-        energy_data = pd.DataFrame([
-            {
-                'timestamp': kpi['timestamp'],
-                'efficacite': kpi['performance_energetique']['efficacite_energetique'],
-                'consommation': kpi['performance_energetique']['consommation_unitaire']
-            }
-            for kpi in kpis_over_time
-        ])
-
-        fig = px.line(energy_data, x='timestamp', y=['efficacite', 'consommation'],
-                     title="Évolution de la Performance Énergétique")
-        st.plotly_chart(fig)
-
-        # Export data
-        excel_data = export_kpi_data(energy_data, "Performance_Energetique")
-        st.download_button(
-            label="📊 Exporter en Excel",
-            data=excel_data,
-            file_name=f"performance_energetique_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-
-    with tabs[1]:
-        st.subheader("Rendement Production")
-
-        prod_data = pd.DataFrame([
-            {
-                'timestamp': kpi['timestamp'],
-                'rendement': kpi['rendement_production']['rendement_matiere'],
-                'productivite': kpi['rendement_production']['productivite']
-            }
-            for kpi in kpis_over_time
-        ])
-
-        fig = px.line(prod_data, x='timestamp', y=['rendement', 'productivite'],
-                     title="Évolution du Rendement de Production")
-        st.plotly_chart(fig)
-
-        excel_data = export_kpi_data(prod_data, "Rendement_Production")
-        st.download_button(
-            label="📊 Exporter en Excel",
-            data=excel_data,
-            file_name=f"rendement_production_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # Get historical data from the store, generating only what is missing
+    df = load_history(HISTORY_STORE, 'demo', 30)  # 30 days of data
+
+    # KPIs configured for the unit in the needs analysis page (all KPIs otherwise)
+    unit_kpis = st.session_state.get('unit_kpis', {})
+    units = ["Toutes les unités"] + sorted(unit_kpis)
+    selected_unit = st.selectbox("Unité", units)
+    kpis = unit_kpis.get(selected_unit) if selected_unit in unit_kpis else None
+    if kpis is not None and not kpis:
+        st.info("Aucun KPI sélectionné pour cette unité dans l'analyse des besoins.")
+        return
+
+    # Only the selected KPIs (and the terms they need) are computed, for every timestamp at once
+    plan = compile_kpi_plan(kpis)
+    kpis_over_time = pd.DataFrame(evaluate_kpi_plan(plan, df), index=df.index).reset_index()
+    st.caption(f"{len(plan['kpis'])} KPI(s) calculé(s) à partir de {len(plan['columns'])} capteur(s)")
+    data_version = dataset_version(df, tuple(plan['kpis']))
+
+    render_rolling_statistics(df, selected_unit, plan['kpis'])
+
+    # Chart resolution: each chart keeps at most max_points over the visible range,
+    # narrowing the range shows it again at full resolution
+    first, last = kpis_over_time['timestamp'].iloc[[0, -1]].dt.to_pydatetime()
+    visible_range = st.slider("Plage affichée", first, last, (first, last), format="DD/MM/YY HH:mm")
+    col1, col2 = st.columns(2)
+    with col1:
+        max_points = st.number_input("Points max. par graphique", 100, 20000, 2000, step=100)
+    with col2:
+        mode = st.selectbox(
+            "Sous-échantillonnage",
+            ['lttb', 'minmax'],
+            format_func=lambda x: "LTTB" if x == 'lttb' else "Enveloppe min/max"
         )
 
-    with tabs[2]:
-        st.subheader("Qualité Production")
-
-        quality_data = pd.DataFrame([
-            {
-                'timestamp': kpi['timestamp'],
-                'conformite': kpi['qualite_production']['taux_conformite'],
-                'dechets': kpi['qualite_production']['taux_dechets']
-            }
-            for kpi in kpis_over_time
-        ])
-
-        fig = px.line(quality_data, x='timestamp', y=['conformite', 'dechets'],
-                     title="Évolution des Métriques de Qualité")
-        st.plotly_chart(fig)
-
-        excel_data = export_kpi_data(quality_data, "Qualite_Production")
-        st.download_button(
-            label="📊 Exporter en Excel",
-            data=excel_data,
-            file_name=f"qualite_production_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    # One tab per category holding at least one computed KPI
+    categories = {category: [name for name in names if name in plan['kpis']]
+                  for category, names in KPI_CATEGORIES.items()}
+    categories = {category: names for category, names in categories.items() if names}
+    tabs = st.tabs([CATEGORY_TABS[category][0] for category in categories])
 
-    with tabs[3]:
-        st.subheader("Maintenance")
-
-        maint_data = pd.DataFrame([
-            {
-                'timestamp': kpi['timestamp'],
-                'MTBF': kpi['maintenance']['mtbf'],
-                'MTTR': kpi['maintenance']['mttr']
-            }
-            for kpi in kpis_over_time
-        ])
-
-        fig = px.line(maint_data, x='timestamp', y=['MTBF', 'MTTR'],
-                     title="Évolution des Métriques de Maintenance")
-        st.plotly_chart(fig)
-
-        excel_data = export_kpi_data(maint_data, "Maintenance")
-        st.download_button(
-            label="📊 Exporter en Excel",
-            data=excel_data,
-            file_name=f"maintenance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    for tab, (category, names) in zip(tabs, categories.items()):
+        title, chart_title, export_category = CATEGORY_TABS[category]
+        with tab:
+            st.subheader(title)
 
-    with tabs[4]:
-        st.subheader("Environnement")
-
-        env_data = pd.DataFrame([
-            {
-                'timestamp': kpi['timestamp'],
-                'emissions_CO2': kpi['environnement']['emissions_co2'],
-                'cons_eau': kpi['environnement']['consommation_eau']
-            }
-            for kpi in kpis_over_time
-        ])
-
-        fig = px.line(env_data, x='timestamp', y=['emissions_CO2', 'cons_eau'],
-                     title="Évolution des Métriques Environnementales")
-        st.plotly_chart(fig)
-
-        excel_data = export_kpi_data(env_data, "Environnement")
-        st.download_button(
-            label="📊 Exporter en Excel",
-            data=excel_data,
-            file_name=f"environnement_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+            category_data = kpis_over_time[['timestamp'] + names]
+            plot_kpi_trend(category_data, names, chart_title, visible_range, max_points, mode)
 
-    with tabs[5]:
-        st.subheader("Coûts")
-
-        cost_data = pd.DataFrame([
-            {
-                'timestamp': kpi['timestamp'],
-                'cout_unitaire': kpi['couts']['cout_unitaire'],
-                'cout_energetique': kpi['couts']['cout_energetique']
-            }
-            for kpi in kpis_over_time
-        ])
-
-        fig = px.line(cost_data, x='timestamp', y=['cout_unitaire', 'cout_energetique'],
-                     title="Évolution des Coûts")
-        st.plotly_chart(fig)
-
-        excel_data = export_kpi_data(cost_data, "Coûts")
-        st.download_button(
-            label="📊 Exporter en Excel",
-            data=excel_data,
-            file_name=f"couts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+            # Export data (generated on request)
+            render_export(category_data, export_category, category, data_version)
 
     # Export global
     st.subheader("Export Global des KPIs")
 
     # Prepare global export
-    all_data = pd.DataFrame([
-        {
-            'timestamp': kpi['timestamp'],
-            'efficacite_energetique': kpi['performance_energetique']['efficacite_energetique'],
-            'rendement_matiere': kpi['rendement_production']['rendement_matiere'],
-            'qualite': kpi['qualite_production']['taux_conformite'],
-            'maintenance_mtbf': kpi['maintenance']['mtbf'],
-            'emissions_co2': kpi['environnement']['emissions_co2'],
-            'cout_unitaire': kpi['couts']['cout_unitaire']
-        }
-        for kpi in kpis_over_time
-    ])
-
-    # Export all data
-    excel_data = export_kpi_data(all_data, "Tous_les_KPIs")
-    st.download_button(
-        label="📊 Exporter tous les KPIs",
-        data=excel_data,
-        file_name=f"tous_les_kpis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    global_columns = [name for name in GLOBAL_EXPORT_KPIS if name in plan['kpis']] or plan['kpis']
+    all_data = kpis_over_time[['timestamp'] + global_columns].rename(
+        columns={'taux_conformite': 'qualite', 'mtbf': 'maintenance_mtbf'}
     )
 
+    # Export data (generated on request)
+    render_export(all_data, "Tous_les_KPIs", "tous_les_kpis", data_version, label="📊 Exporter tous les KPIs")
+
 if __name__ == "__main__":
     render_kpi_monitoring()
\ No newline at end of file
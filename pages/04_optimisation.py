@@ -2,13 +2,32 @@ import streamlit as st
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from utils.optimization import optimize_parameters
-from utils.simulation import ProcessSimulator
+from utils.optimization import optimize_parameters, pareto_front, process_outcomes
+from utils.optimum_table import OPTIMUM_TABLE
+from utils.result_cache import RESULT_CACHE
+from utils.surrogate import KPI_SURROGATE
 import io
 from datetime import datetime
 
 st.set_page_config(page_title="Optimisation", page_icon="⚡")
 
+def plot_pareto_front(front, parameters):
+    """Tracer le front de Pareto (qualité / énergie, couleur = rendement) et le point retenu"""
+    quality, _, energy = process_outcomes(parameters)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=front['energy_consumption'], y=front['product_quality'], mode='markers',
+        marker={'color': front['yield_rate'], 'colorscale': 'Viridis', 'showscale': True,
+                'colorbar': {'title': "Rendement"}},
+        name="Front de Pareto"
+    ))
+    fig.add_trace(go.Scatter(
+        x=[energy], y=[quality], mode='markers',
+        marker={'color': 'red', 'size': 14, 'symbol': 'star'}, name="Point retenu"
+    ))
+    fig.update_layout(title="Compromis Qualité / Énergie", xaxis_title="Énergie", yaxis_title="Qualité")
+    return fig
+
 def render_optimisation():
     st.title("⚡ Optimisation Multi-objectifs")
 
@@ -73,91 +92,104 @@ def render_optimisation():
 
     initial_guess = [initial_temp, initial_pressure, initial_flow]
 
-    if st.button("Optimiser"):
-        # Run optimization
-        result = optimize_parameters(initial_guess, weights)
-
-        if result['success']:
-            st.success("Optimisation réussie!")
-
-            # Display results
+    # Optimum interpolated in the table precomputed over the weights (built on first use)
+    result = OPTIMUM_TABLE.query_result(weights)
+    optimal = list(result['optimal_parameters'].values())
+    st.plotly_chart(plot_pareto_front(pareto_front(), optimal))
+
+    # Optional exact solve: multi-start global search for the current weights
+    if st.checkbox("Recherche globale multi-départs (solution exacte)"):
+        result = optimize_parameters(initial_guess, weights, n_starts=32, use_cache=True)
+        statistics = result['statistics']
+        st.caption(f"{statistics['completed']} départs sur {statistics['starts']} exécutés "
+                   f"({'arrêt anticipé' if statistics['stopped_early'] else 'tous terminés'}), "
+                   f"{statistics['distinct_optima']} optimum(s) distinct(s), "
+                   f"{statistics['evaluations']} évaluations en {statistics['elapsed'] * 1000:.0f} ms")
+
+    cache_stats = RESULT_CACHE.stats()
+    st.caption(f"Cache de résultats : {cache_stats['hit_rate']:.0%} de requêtes servies "
+               f"({cache_stats['memory_hits']} mémoire, {cache_stats['disk_hits']} disque, "
+               f"{cache_stats['misses']} calculées)")
+
+    if result['success']:
+        st.success("Optimisation réussie!")
+
+        # Display results
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.subheader("Paramètres Optimaux")
+
+            # Parameters comparison
+            params_comparison = pd.DataFrame({
+                'Paramètre': ['Température', 'Pression', 'Débit'],
+                'Initial': initial_guess,
+                'Optimal': [
+                    result['optimal_parameters']['temperature'],
+                    result['optimal_parameters']['pressure'],
+                    result['optimal_parameters']['flow_rate']
+                ]
+            })
+
+            # Add export buttons
             col1, col2 = st.columns(2)
-
             with col1:
-                st.subheader("Paramètres Optimaux")
-
-                # Parameters comparison
-                params_comparison = pd.DataFrame({
-                    'Paramètre': ['Température', 'Pression', 'Débit'],
-                    'Initial': initial_guess,
-                    'Optimal': [
-                        result['optimal_parameters']['temperature'],
-                        result['optimal_parameters']['pressure'],
-                        result['optimal_parameters']['flow_rate']
-                    ]
-                })
-
-                # Add export buttons
-                col1, col2 = st.columns(2)
-                with col1:
-                    csv = params_comparison.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Exporter en CSV",
-                        data=csv,
-                        file_name=f"parametres_optimaux_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv"
-                    )
-
-                with col2:
-                    # Export to Excel
-                    excel_buffer = io.BytesIO()
-                    with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                        params_comparison.to_excel(writer, index=False, sheet_name='Paramètres')
-                    excel_data = excel_buffer.getvalue()
-
-                    st.download_button(
-                        label="📊 Exporter en Excel",
-                        data=excel_data,
-                        file_name=f"parametres_optimaux_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-
-                fig = go.Figure(data=[
-                    go.Bar(name='Initial', x=params_comparison['Paramètre'], y=params_comparison['Initial']),
-                    go.Bar(name='Optimal', x=params_comparison['Paramètre'], y=params_comparison['Optimal'])
-                ])
-                fig.update_layout(barmode='group', title="Comparaison des Paramètres")
-                st.plotly_chart(fig)
+                csv = params_comparison.to_csv(index=False)
+                st.download_button(
+                    label="📥 Exporter en CSV",
+                    data=csv,
+                    file_name=f"parametres_optimaux_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv"
+                )
 
             with col2:
-                st.subheader("Performance Prédite")
-
-                # Simulate with optimal parameters
-                simulator = ProcessSimulator()
-                optimal_simulation = simulator.simulate_process(result['optimal_parameters'])
-                optimal_kpis = simulator.predict_kpis(optimal_simulation)
-
-                # Display KPIs
-                for kpi_name, value in optimal_kpis.items():
-                    fig = go.Figure(go.Indicator(
-                        mode = "gauge+number",
-                        value = value,
-                        title = {'text': kpi_name.replace('_', ' ').title()},
-                        gauge = {
-                            'axis': {'range': [None, 100]},
-                            'bar': {'color': "#0066cc"},
-                            'steps': [
-                                {'range': [0, 60], 'color': "lightgray"},
-                                {'range': [60, 80], 'color': "gray"},
-                                {'range': [80, 100], 'color': "darkgray"}
-                            ]
-                        }
-                    ))
-                    fig.update_layout(height=200)
-                    st.plotly_chart(fig)
-
-        else:
-            st.error("L'optimisation n'a pas convergé. Veuillez ajuster les paramètres initiaux.")
+                # Export to Excel
+                excel_buffer = io.BytesIO()
+                with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+                    params_comparison.to_excel(writer, index=False, sheet_name='Paramètres')
+                excel_data = excel_buffer.getvalue()
+
+                st.download_button(
+                    label="📊 Exporter en Excel",
+                    data=excel_data,
+                    file_name=f"parametres_optimaux_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
+            fig = go.Figure(data=[
+                go.Bar(name='Initial', x=params_comparison['Paramètre'], y=params_comparison['Initial']),
+                go.Bar(name='Optimal', x=params_comparison['Paramètre'], y=params_comparison['Optimal'])
+            ])
+            fig.update_layout(barmode='group', title="Comparaison des Paramètres")
+            st.plotly_chart(fig)
+
+        with col2:
+            st.subheader("Performance Prédite")
+
+            # Surrogate of the simulated KPIs (falls back to the simulation when not accurate enough)
+            optimal_kpis = KPI_SURROGATE.predict_kpis(result['optimal_parameters'])
+
+            # Display KPIs
+            for kpi_name, value in optimal_kpis.items():
+                fig = go.Figure(go.Indicator(
+                    mode = "gauge+number",
+                    value = value,
+                    title = {'text': kpi_name.replace('_', ' ').title()},
+                    gauge = {
+                        'axis': {'range': [None, 100]},
+                        'bar': {'color': "#0066cc"},
+                        'steps': [
+                            {'range': [0, 60], 'color': "lightgray"},
+                            {'range': [60, 80], 'color': "gray"},
+                            {'range': [80, 100], 'color': "darkgray"}
+                        ]
+                    }
+                ))
+                fig.update_layout(height=200)
+                st.plotly_chart(fig)
+
+    else:
+        st.error("L'optimisation n'a pas convergé. Veuillez ajuster les paramètres initiaux.")
 
 if __name__ == "__main__":
     render_optimisation()
\ No newline at end of file
@@ -2,8 +2,9 @@ import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
 from datetime import datetime
+from utils.anomaly_detection import render_alerts
 from utils.data_generator import generate_sample_data
-from utils.kpi_calculator import calculate_all_kpis
+from utils.kpi_calculator import calculate_kpis
 
 # Configuration de la page
 st.set_page_config(
@@ -69,12 +70,12 @@ with col1:
     
     # Generate sample data
     current_data = generate_sample_data()
-    kpis = calculate_all_kpis(current_data)
+    kpis = calculate_kpis(current_data, ['efficacite_energetique'])
     
     # Create gauge chart for overall efficiency
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
-        value=kpis['performance_energetique']['efficacite_energetique'],
+        value=kpis['efficacite_energetique'],
         title={'text': "Efficacité Globale"},
         gauge={
             'axis': {'range': [None, 100]},
@@ -108,16 +109,8 @@ with col2:
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     st.info(f"Dernière mise à jour: {current_time}")
     
-    # Industry-specific alerts
-    if st.session_state.industry_type == 'petrol':
-        st.warning("⚠️ Pression du système au-dessus du seuil normal")
-        st.success("✅ Qualité du produit conforme aux spécifications")
-    elif st.session_state.industry_type == 'agro':
-        st.warning("⚠️ Température de stockage proche de la limite")
-        st.success("✅ Traçabilité des lots validée")
-    else:
-        st.warning("⚠️ Maintenance préventive requise sur ligne 2")
-        st.success("✅ Tests de qualité conformes aux normes GMP")
+    # Alerts computed from the sensor readings
+    render_alerts(selected_unit)
 
 # Navigation
 st.subheader("Navigation")
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.testing import assert_allclose
+from utils.anomaly_detection import AlertFeed, AnomalyDetector, detect_alerts
+from utils.data_generator import SENSOR_CHANNELS, generate_historical_frame
+
+CHANNELS = list(SENSOR_CHANNELS)
+
+@pytest.fixture
+def frame():
+    frame = generate_historical_frame(start='2024-01-01', end='2024-01-02', freq='min', rng=0)
+    # A spike, a level shift and a slow drift on three channels
+    frame.iloc[300, frame.columns.get_loc('temperature')] += 12 * SENSOR_CHANNELS['temperature'][1]
+    frame.iloc[600:, frame.columns.get_loc('pressure')] += 2 * SENSOR_CHANNELS['pressure'][1]
+    drift = np.linspace(0, 4, len(frame) - 900) * SENSOR_CHANNELS['flow_rate'][1]
+    frame.iloc[900:, frame.columns.get_loc('flow_rate')] += drift
+    return frame
+
+def detector():
+    return AnomalyDetector([('U1', channel) for channel in CHANNELS],
+                           baseline_mean=[SENSOR_CHANNELS[channel][0] for channel in CHANNELS],
+                           baseline_std=[SENSOR_CHANNELS[channel][1] for channel in CHANNELS])
+
+def assert_same_alerts(incremental, single_pass):
+    key = lambda alert: (alert.onset, alert.channel, alert.detector)
+    incremental, single_pass = sorted(incremental, key=key), sorted(single_pass, key=key)
+    assert [alert[:6] for alert in incremental] == [alert[:6] for alert in single_pass]
+    assert_allclose([alert.score for alert in incremental], [alert.score for alert in single_pass], rtol=1e-9)
+
+def test_injected_anomalies_are_detected(frame):
+    alerts, _ = detect_alerts(frame, unit='U1', channels=CHANNELS)
+    raised = {(alert.channel, alert.detector) for alert in alerts}
+    assert {('temperature', 'mad'), ('temperature', 'rate'), ('pressure', 'cusum'),
+            ('flow_rate', 'ewma')} <= raised
+
+@pytest.mark.parametrize('batch_sizes', [[1], [7, 60, 13], [240]])
+def test_incremental_updates_match_single_pass(frame, batch_sizes):
+    values = frame[CHANNELS].to_numpy()
+    single_pass = detector()
+    expected = single_pass.update(frame.index, values)
+
+    incremental = detector()
+    alerts, start, turn = [], 0, 0
+    while start < len(frame):
+        stop = min(len(frame), start + batch_sizes[turn % len(batch_sizes)])
+        alerts.extend(incremental.update(frame.index[start:stop], values[start:stop]))
+        start, turn = stop, turn + 1
+
+    assert_same_alerts(alerts, expected)
+    assert_same_alerts(incremental.active_alerts(), single_pass.active_alerts())
+
+def test_feed_refreshes_match_single_refresh(frame):
+    source = lambda start, end, freq: frame.loc[start:end - pd.Timedelta(1, 'ns')]
+    end = frame.index[-1] + pd.Timedelta(minutes=1)
+
+    single = AlertFeed('U1', window=pd.Timedelta(days=1), source=source)
+    expected, expected_active = single.refresh(now=end)
+
+    feed = AlertFeed('U1', window=pd.Timedelta(days=1), source=source)
+    feed.refresh(now=frame.index[0] + pd.Timedelta(hours=4))
+    for now in pd.date_range(frame.index[0] + pd.Timedelta(hours=5), end, freq='37min'):
+        feed.refresh(now=now)
+    alerts, active = feed.refresh(now=end)
+
+    assert len(expected) > 0
+    assert_same_alerts(alerts, expected)
+    assert_same_alerts(active, expected_active)
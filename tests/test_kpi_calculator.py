@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from utils.kpi_calculator import (KPI_CATEGORIES, calculate_all_kpis, calculate_cost_metrics,
+                                  calculate_energy_efficiency, calculate_environmental_metrics, calculate_kpi_frame,
+                                  calculate_kpis, calculate_production_performance, calculate_quality_metrics,
+                                  compile_kpi_plan)
+
+CHANNELS = ('energy_consumption', 'product_output', 'raw_material_input', 'product_quality', 'waste_generated',
+            'maintenance_hours', 'co2_emissions', 'water_consumption', 'production_cost')
+
+@pytest.fixture
+def readings():
+    rng = np.random.default_rng(0)
+    return {name: rng.uniform(0.1, 1000.0, 100_000) for name in CHANNELS}
+
+def test_frame_matches_scalar_functions(readings):
+    frame = calculate_kpi_frame(readings)
+    # The scalar functions work elementwise on arrays, except the max() of the MTBF
+    # (checked on single readings below)
+    for function in (calculate_energy_efficiency, calculate_production_performance, calculate_quality_metrics,
+                     calculate_environmental_metrics, calculate_cost_metrics):
+        for name, expected in function(readings).items():
+            assert_array_equal(frame[name].to_numpy(), expected, err_msg=name)
+
+def test_single_readings_match_scalar_functions(readings):
+    for row in range(50):
+        reading = {name: float(values[row]) for name, values in readings.items()}
+        computed = calculate_kpis(reading)
+        for values in calculate_all_kpis(reading).values():
+            for name, expected in values.items():
+                assert computed[name] == expected, name
+
+def test_every_category_is_reported():
+    assert set(KPI_CATEGORIES) >= set(calculate_all_kpis({name: 1.0 for name in CHANNELS}))
+
+def test_plan_reads_only_needed_channels():
+    plan = compile_kpi_plan(['efficacite_energetique'])
+    assert sorted(plan['columns']) == ['energy_consumption', 'product_output']
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+from scipy.optimize import approx_fprime
+from utils.optimization import DEFAULT_BOUNDS, objective_function, objective_gradient, objective_hessian
+
+WEIGHTS = [(0.4, 0.4, 0.2), (1.0, 0.0, 0.0), (0.1, 0.3, 0.6)]
+
+@pytest.fixture
+def candidates():
+    rng = np.random.default_rng(0)
+    low, high = np.array(DEFAULT_BOUNDS).T
+    return rng.uniform(low, high, size=(20, 3))
+
+@pytest.mark.parametrize('weights', WEIGHTS)
+def test_gradient_matches_finite_differences(candidates, weights):
+    for x in candidates:
+        numerical = approx_fprime(x, objective_function, 1e-6, weights)
+        assert_allclose(objective_gradient(x, weights), numerical, rtol=1e-5, atol=1e-4)
+
+@pytest.mark.parametrize('weights', WEIGHTS)
+def test_hessian_matches_finite_differences(candidates, weights):
+    for x in candidates:
+        numerical = np.array([approx_fprime(x, lambda y: objective_gradient(y, weights)[i], 1e-6)
+                              for i in range(3)])
+        assert_allclose(objective_hessian(x, weights), numerical, rtol=1e-5, atol=1e-6)
+
+@pytest.mark.parametrize('weights', WEIGHTS)
+def test_vectorized_calls_match_single_candidates(candidates, weights):
+    values = objective_function(candidates, weights)
+    gradients = objective_gradient(candidates, weights)
+    for x, value, gradient in zip(candidates, values, gradients):
+        assert_allclose(value, objective_function(x, weights), rtol=1e-14)
+        assert_allclose(gradient, objective_gradient(x, weights), rtol=1e-14)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+from utils.simulation import DEFAULT_PARAMETERS, ProcessSimulator
+
+SCENARIOS = [
+    DEFAULT_PARAMETERS,
+    {'temperature': 120, 'heat_input': 2500, 'inlet_temperature': 15, 'flow_rate': 40},
+    {'temperature': 180, 'heat_input': 200, 'inlet_temperature': 30, 'flow_rate': 180},
+    {'temperature': 90, 'heat_input': 1500, 'inlet_temperature': 20, 'flow_rate': 0}
+]
+
+@pytest.fixture
+def simulator():
+    return ProcessSimulator()
+
+@pytest.mark.parametrize('parameters', SCENARIOS)
+def test_closed_form_matches_ode(simulator, parameters):
+    analytical = simulator.simulate_process(parameters, duration=4 * 3600, solver='analytical')
+    numerical = simulator.simulate_process(parameters, duration=4 * 3600, solver='odeint')
+    assert_array_equal(analytical['time'], numerical['time'])
+    assert_allclose(analytical['temperature'], numerical['temperature'], rtol=0, atol=1e-4)
+
+def test_auto_solver_is_closed_form_for_the_linear_model(simulator):
+    auto = simulator.simulate_process(DEFAULT_PARAMETERS, solver='auto')
+    analytical = simulator.simulate_process(DEFAULT_PARAMETERS, solver='analytical')
+    assert_array_equal(auto['temperature'], analytical['temperature'])
+
+@pytest.mark.parametrize('solver', ['analytical', 'odeint'])
+def test_batch_matches_single_runs(simulator, solver):
+    columns = {name: np.array([scenario[name] for scenario in SCENARIOS]) for name in DEFAULT_PARAMETERS}
+    batch = simulator.simulate_batch(**columns, duration=7200, solver=solver)
+    for row, parameters in enumerate(SCENARIOS):
+        single = simulator.simulate_process(parameters, duration=7200, solver=solver)
+        assert_array_equal(batch['time'], single['time'])
+        assert_allclose(batch['temperature'][row], single['temperature'], rtol=0,
+                        atol=1e-12 if solver == 'analytical' else 1e-4)
+        assert batch['energy_consumption'][row] == single['energy_consumption']
+        assert batch['product_output'][row] == single['product_output']
+        assert batch['setpoint'][row] == single['setpoint']
+
+def test_batch_broadcasts_scalars(simulator):
+    batch = simulator.simulate_batch(flow_rate=np.array([50.0, 100.0, 150.0]))
+    assert batch['temperature'].shape == (3, len(batch['time']))
+    assert_array_equal(batch['setpoint'], np.full(3, DEFAULT_PARAMETERS['temperature']))
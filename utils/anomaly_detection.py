@@ -0,0 +1,281 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from scipy.signal import lfilter
+from utils.data_generator import CHANNEL_LABELS, SENSOR_CHANNELS, generate_historical_frame
+
+# Alert raised by a detector on one series
+# severity: 'warning' or 'critical'; onset: timestamp of the first anomalous reading
+Alert = namedtuple('Alert', ['severity', 'unit', 'channel', 'detector', 'onset', 'value', 'score'])
+
+DETECTORS = ('ewma', 'cusum', 'mad', 'rate')
+
+# Display labels of the detectors
+DETECTOR_LABELS = {
+    'ewma': "dérive (EWMA)",
+    'cusum': "changement de niveau (CUSUM)",
+    'mad': "valeur aberrante (MAD)",
+    'rate': "variation brutale"
+}
+
+class AnomalyDetector:
+    """
+    Statistical anomaly detection over many series at once
+    Every update receives a batch of readings shaped (time, series); all detectors
+    are evaluated on every series with array operations and keep their state
+    between batches, so the cost of an update depends only on the batch size.
+
+    series: list of (unit, channel) pairs, one per column of the batches
+    baseline_mean, baseline_std: expected level of each series (estimated from
+        the first batch when None)
+    ewma_alpha, ewma_limit: EWMA smoothing factor and control limit (in sigmas)
+    cusum_k, cusum_h: CUSUM slack and decision interval (in sigmas)
+    mad_window, mad_limit: robust z-score window (readings) and limit
+    mad_refresh: readings between two refreshes of the median/MAD reference
+    rate_limit: maximum change between two readings (in sigmas)
+    critical_factor: score ratio above the limit at which an alert becomes critical
+    """
+
+    def __init__(self, series, baseline_mean=None, baseline_std=None, ewma_alpha=0.1, ewma_limit=3.5,
+                 cusum_k=0.5, cusum_h=8.0, mad_window=120, mad_limit=5.0, mad_refresh=10,
+                 rate_limit=6.0, critical_factor=2.0):
+        self.series = list(series)
+        self.n_series = len(self.series)
+        self.baseline_mean = None if baseline_mean is None else np.asarray(baseline_mean, dtype=np.float64)
+        self.baseline_std = None if baseline_std is None else np.asarray(baseline_std, dtype=np.float64)
+        self.ewma_alpha = ewma_alpha
+        self.ewma_limit = ewma_limit
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.mad_window = mad_window
+        self.mad_limit = mad_limit
+        self.mad_refresh = mad_refresh
+        self.rate_limit = rate_limit
+        self.critical_factor = critical_factor
+        self.limits = {'ewma': ewma_limit, 'cusum': cusum_h, 'mad': mad_limit, 'rate': rate_limit}
+
+        self.ewma = None
+        self.cusum_high = np.zeros(self.n_series)
+        self.cusum_low = np.zeros(self.n_series)
+        self.history = np.zeros((self.n_series, mad_window))
+        self.history_position = 0
+        self.history_filled = 0
+        self.mad_reference = None
+        self.since_refresh = 0
+        self.last_value = None
+        # Flags at the last reading and onset of the ongoing episode of each detector and series
+        self.onsets = {name: np.full(self.n_series, np.datetime64('NaT'), dtype='datetime64[ns]')
+                       for name in DETECTORS}
+        self.flags = {name: np.zeros(self.n_series, dtype=bool) for name in DETECTORS}
+        self.last_scores = {name: np.zeros(self.n_series) for name in DETECTORS}
+        self.last_values = np.full(self.n_series, np.nan)
+
+    @classmethod
+    def for_frames(cls, units, channels, **options):
+        """Detector for the given channels of several units (columns ordered unit by unit)"""
+        return cls([(unit, channel) for unit in units for channel in channels], **options)
+
+    def _init_baseline(self, values):
+        """Estimate the baseline from the first batch with median and MAD"""
+        median = np.nanmedian(values, axis=0)
+        mad = np.nanmedian(np.abs(values - median), axis=0) * 1.4826
+        if self.baseline_mean is None:
+            self.baseline_mean = median
+        if self.baseline_std is None:
+            self.baseline_std = np.where(mad > 0, mad, np.maximum(np.abs(median) * 0.01, 1e-12))
+
+    def _ewma_scores(self, z):
+        """EWMA of the standardized values, scored against its asymptotic sigma"""
+        alpha = self.ewma_alpha
+        initial = np.zeros(self.n_series) if self.ewma is None else self.ewma
+        smoothed, state = lfilter([alpha], [1, -(1 - alpha)], np.nan_to_num(z), axis=0,
+                                  zi=((1 - alpha) * initial)[None, :])
+        self.ewma = state[0] / (1 - alpha)
+        sigma = np.sqrt(alpha / (2 - alpha))
+        return np.abs(smoothed) / sigma
+
+    def _cusum_scores(self, z):
+        """Two-sided tabular CUSUM on the standardized values"""
+        scores = np.empty_like(z)
+        high, low = self.cusum_high, self.cusum_low
+        for t in range(len(z)):
+            row = np.nan_to_num(z[t])
+            high = np.maximum(0.0, high + row - self.cusum_k)
+            low = np.maximum(0.0, low - row - self.cusum_k)
+            scores[t] = np.maximum(high, low)
+        self.cusum_high, self.cusum_low = high, low
+        return scores
+
+    def _mad_scores(self, values):
+        """
+        Robust z-score of each reading against the last mad_window readings
+        The median and MAD reference comes from a ring buffer of past readings and
+        is refreshed every mad_refresh readings, which amortizes the cost of the
+        medians over several ticks.
+        """
+        scores = np.zeros_like(values)
+        start = 0
+        while start < len(values):
+            # The reference needs half a window of history to be meaningful
+            if self.since_refresh >= self.mad_refresh and self.history_filled >= self.mad_window // 2:
+                reference = self.history[:, :self.history_filled]
+                median_function = np.nanmedian if np.isnan(reference).any() else np.median
+                with np.errstate(invalid='ignore'):
+                    median = median_function(reference, axis=1)
+                    mad = median_function(np.abs(reference - median[:, None]), axis=1)
+                self.mad_reference = (median, np.where(mad > 0, mad, np.nan))
+                self.since_refresh = 0
+
+            # Readings scored against the current reference
+            stop = min(len(values), start + max(1, self.mad_refresh - self.since_refresh % self.mad_refresh))
+            chunk = values[start:stop]
+            if self.mad_reference is not None:
+                median, mad = self.mad_reference
+                with np.errstate(invalid='ignore'):
+                    scores[start:stop] = np.abs(0.6745 * (chunk - median) / mad)
+
+            # Push the chunk into the ring buffer
+            for row in chunk[-self.mad_window:]:
+                self.history[:, self.history_position] = row
+                self.history_position = (self.history_position + 1) % self.mad_window
+            self.history_filled = min(self.mad_window, self.history_filled + len(chunk))
+            self.since_refresh += len(chunk)
+            start = stop
+        return np.nan_to_num(scores)
+
+    def _rate_scores(self, values):
+        """Change between consecutive readings, in baseline sigmas"""
+        previous = np.vstack([self.last_value if self.last_value is not None else values[:1], values[:-1]])
+        self.last_value = values[-1:]
+        return np.nan_to_num(np.abs(values - previous) / self.baseline_std)
+
+    def update(self, timestamps, values):
+        """
+        Process a batch of readings
+        timestamps: array of the batch timestamps (length T)
+        values: array (T, n_series)
+        Returns the alerts whose onset falls in this batch, in time order.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), self.n_series)
+        timestamps = np.asarray(pd.DatetimeIndex(timestamps).as_unit('ns'))
+        if self.baseline_std is None or self.baseline_mean is None:
+            self._init_baseline(values)
+
+        z = (values - self.baseline_mean) / self.baseline_std
+        scores = {
+            'ewma': self._ewma_scores(z),
+            'cusum': self._cusum_scores(z),
+            'mad': self._mad_scores(values),
+            'rate': self._rate_scores(values)
+        }
+
+        alerts = []
+        rows = np.arange(len(values))[:, None]
+        for name, score in scores.items():
+            flagged = score > self.limits[name]
+            # An episode starts on a flagged reading following an unflagged one
+            previous = np.vstack([self.flags[name][None, :], flagged[:-1]])
+            starts = flagged & ~previous
+            for row, column in zip(*np.nonzero(starts)):
+                alerts.append(self._alert(name, column, timestamps[row], values[row, column], score[row, column]))
+
+            last_start = np.where(starts, rows, -1).max(axis=0)
+            onsets = self.onsets[name]
+            restarted = last_start >= 0
+            onsets[restarted] = timestamps[last_start[restarted]]
+            onsets[~flagged[-1]] = np.datetime64('NaT')
+            self.flags[name] = flagged[-1]
+            self.last_scores[name] = score[-1]
+        self.last_values = values[-1]
+        return sorted(alerts, key=lambda alert: alert.onset)
+
+    def _alert(self, detector, column, onset, value, score):
+        unit, channel = self.series[column]
+        severity = 'critical' if score > self.critical_factor * self.limits[detector] else 'warning'
+        return Alert(severity, unit, channel, detector, pd.Timestamp(onset), float(value), float(score))
+
+    def active_alerts(self):
+        """Alerts of every episode still ongoing after the last batch, most severe first"""
+        alerts = []
+        for name in DETECTORS:
+            for column in np.flatnonzero(~np.isnat(self.onsets[name])):
+                alerts.append(self._alert(name, column, self.onsets[name][column],
+                                          self.last_values[column], self.last_scores[name][column]))
+        return sorted(alerts, key=lambda alert: (alert.severity != 'critical', -alert.score))
+
+def detect_alerts(frame, unit=None, channels=None, **options):
+    """
+    Run every detector over a DataFrame of readings indexed by timestamp
+    Sensor channels default to the baseline of utils.data_generator.SENSOR_CHANNELS.
+    Returns (alerts raised over the frame, alerts still active at its end).
+    """
+    channels = list(channels or frame.columns)
+    if all(channel in SENSOR_CHANNELS for channel in channels):
+        options.setdefault('baseline_mean', [SENSOR_CHANNELS[channel][0] for channel in channels])
+        options.setdefault('baseline_std', [SENSOR_CHANNELS[channel][1] for channel in channels])
+    detector = AnomalyDetector([(unit, channel) for channel in channels], **options)
+    alerts = detector.update(frame.index, frame[channels].to_numpy())
+    return alerts, detector.active_alerts()
+
+class AlertFeed:
+    """
+    Alerts of one unit over a sliding window of readings
+    The detector keeps its state between refreshes, so each refresh only
+    produces and scores the readings received since the previous one.
+
+    window: period over which raised alerts are kept
+    freq: pandas frequency of the readings
+    source: callable(start, end, freq) returning the readings of [start, end)
+        (synthetic readings from utils.data_generator by default)
+    """
+
+    def __init__(self, unit, window=pd.Timedelta(days=1), freq='min', source=None):
+        self.unit = unit
+        self.window = pd.Timedelta(window)
+        self.freq = freq
+        self.source = source or (lambda start, end, freq: generate_historical_frame(start=start, end=end, freq=freq))
+        channels = list(SENSOR_CHANNELS)
+        self.detector = AnomalyDetector([(unit, channel) for channel in channels],
+                                        baseline_mean=[SENSOR_CHANNELS[channel][0] for channel in channels],
+                                        baseline_std=[SENSOR_CHANNELS[channel][1] for channel in channels])
+        self.channels = channels
+        self.alerts = []
+        self.last = None
+
+    def refresh(self, now=None):
+        """
+        Score the readings up to now
+        Returns (alerts raised within the window, alerts still active).
+        """
+        end = pd.Timestamp(now if now is not None else pd.Timestamp.now()).floor(self.freq)
+        start = end - self.window if self.last is None else max(self.last, end - self.window)
+        if end > start:
+            frame = self.source(start, end, self.freq)
+            if len(frame):
+                self.alerts.extend(self.detector.update(frame.index, frame[self.channels].to_numpy()))
+                self.last = frame.index[-1] + pd.tseries.frequencies.to_offset(self.freq)
+        self.alerts = [alert for alert in self.alerts if alert.onset >= end - self.window]
+        return self.alerts, self.detector.active_alerts()
+
+def render_alerts(unit):
+    """Afficher les alertes détectées sur les dernières 24 heures de relevés"""
+    import streamlit as st
+
+    # One feed per unit and session: reruns only score the new readings
+    feeds = st.session_state.setdefault('alert_feeds', {})
+    if unit not in feeds:
+        feeds[unit] = AlertFeed(unit)
+    alerts, active = feeds[unit].refresh()
+
+    for alert in active:
+        message = (f"⚠️ {CHANNEL_LABELS[alert.channel]} : {DETECTOR_LABELS[alert.detector]} "
+                   f"depuis {alert.onset.strftime('%H:%M')} (score {alert.score:.1f})")
+        if alert.severity == 'critical':
+            st.error(message)
+        else:
+            st.warning(message)
+
+    if not active:
+        st.success("✅ Aucune anomalie en cours")
+    if alerts:
+        st.caption(f"{len(alerts)} alerte(s) sur les dernières 24 heures")
@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.optimize import least_squares
+from utils.simulation import ProcessSimulator
+
+# Fitted parameters, in the order of the least-squares vector:
+# volume (m³), heat capacity rho*cp (kJ/m³.K), heat loss (kW/K), ambient temperature (°C)
+CALIBRATED_PARAMETERS = ('volume', 'heat_capacity', 'heat_loss', 'ambient_temperature')
+
+# Columns of the historical frames, named like the simulate_process parameters
+CALIBRATION_COLUMNS = ('temperature', 'flow_rate', 'heat_input', 'inlet_temperature')
+
+def calibration_windows(frame, window=30):
+    """
+    Cut a history into consecutive windows of `window` steps
+    frame: DataFrame indexed by timestamp with the CALIBRATION_COLUMNS
+    Inputs are held constant over every step (zero-order hold). Windows
+    containing missing readings are dropped.
+    Returns a dict of arrays: 'temperature' (windows x window + 1) and
+    'dt', 'flow_rate', 'heat_input', 'inlet_temperature' (windows x window).
+    """
+    frame = frame.sort_index()
+    seconds = pd.DatetimeIndex(frame.index).as_unit('ns').asi8 / 1e9
+    dt = np.diff(seconds)
+    columns = {name: frame[name].to_numpy(dtype=np.float64) for name in CALIBRATION_COLUMNS}
+
+    # Windows share their boundary readings: window i covers rows [i*W, (i+1)*W]
+    windows = {'temperature': sliding_window_view(columns['temperature'], window + 1)[::window],
+               'dt': sliding_window_view(dt, window)[::window]}
+    for name in CALIBRATION_COLUMNS[1:]:
+        windows[name] = sliding_window_view(columns[name][:-1], window)[::window]
+
+    valid = np.isfinite(windows['temperature']).all(axis=1)
+    for name in ('dt',) + CALIBRATION_COLUMNS[1:]:
+        valid &= np.isfinite(windows[name]).all(axis=1)
+    return {name: values[valid] for name, values in windows.items()}
+
+def window_response(theta, windows):
+    """
+    Closed-form response of the energy balance over every window, with sensitivities
+    Each window starts from its measured temperature and is propagated step by
+    step with the exact solution of the linear ODE; the sensitivities follow
+    the same recursion, all windows being advanced together.
+    theta: (volume, heat_capacity, heat_loss, ambient_temperature)
+    Returns (predicted temperatures (windows x window), Jacobian (windows x window x 4)).
+    """
+    volume, heat_capacity, heat_loss, ambient = theta
+    flow, Q_in, T_in, dt = (windows[name] for name in ('flow_rate', 'heat_input', 'inlet_temperature', 'dt'))
+    flow = flow / 3600  # m³/h -> m³/s
+
+    # dT/dt = -k T + N
+    b = 1 / (volume * heat_capacity)
+    source = Q_in + heat_loss * ambient
+    k = flow / volume + heat_loss * b
+    N = flow * T_in / volume + source * b
+    dk = np.stack([-flow / volume**2 - heat_loss * b / volume, np.broadcast_to(-heat_loss * b / heat_capacity, k.shape),
+                   np.broadcast_to(b, k.shape), np.zeros_like(k)], axis=-1)
+    dN = np.stack([-flow * T_in / volume**2 - source * b / volume, -source * b / heat_capacity,
+                   np.broadcast_to(ambient * b, k.shape), np.broadcast_to(heat_loss * b, k.shape)], axis=-1)
+
+    # Over a step: T' = T e + N g with e = exp(-k dt) and g = (1 - e) / k
+    e = np.exp(-k * dt)
+    small = np.abs(k * dt) < 1e-8
+    safe_k = np.where(small, 1.0, k)
+    g = np.where(small, dt, -np.expm1(-k * dt) / safe_k)
+    dg = np.where(small, -dt**2 / 2, (dt * e - g) / safe_k)
+
+    n_windows, n_steps = k.shape
+    predicted = np.empty((n_windows, n_steps))
+    jacobian = np.empty((n_windows, n_steps, len(theta)))
+    T = windows['temperature'][:, 0]
+    sensitivity = np.zeros((n_windows, len(theta)))
+    for j in range(n_steps):
+        dT_dk = -dt[:, j] * e[:, j] * T + N[:, j] * dg[:, j]
+        sensitivity = (e[:, j, None] * sensitivity + dT_dk[:, None] * dk[:, j]
+                       + g[:, j, None] * dN[:, j])
+        T = T * e[:, j] + N[:, j] * g[:, j]
+        predicted[:, j] = T
+        jacobian[:, j] = sensitivity
+    return predicted, jacobian
+
+def calibrate(frame, simulator=None, window=30, loss='linear', max_nfev=100):
+    """
+    Fit the simulator constants to a history of readings
+    frame: DataFrame indexed by timestamp with the CALIBRATION_COLUMNS (flow
+        rate in the units of ProcessSimulator.simulate_process)
+    simulator: initial guess (a default ProcessSimulator when None)
+    window: steps simulated from every measured starting point
+    loss: least_squares loss ('linear', or 'soft_l1' / 'huber' for outliers)
+    rho and cp only enter the energy balance through their product, so the
+    heat capacity rho*cp is fitted and cp is derived from the nominal rho.
+    Returns a dict: parameters (volume, cp, rho, heat_loss, ambient_temperature),
+    rmse (°C), n_windows, nfev, success, elapsed (s).
+    """
+    start = time.perf_counter()
+    simulator = simulator or ProcessSimulator()
+    windows = calibration_windows(frame, window)
+    measured = windows['temperature'][:, 1:]
+    if not len(measured):
+        raise ValueError("Historique trop court ou incomplet pour la calibration")
+
+    theta0 = np.array([simulator.volume, simulator.rho * simulator.cp, simulator.heat_loss,
+                       simulator.ambient_temperature])
+
+    def residuals(theta):
+        return (window_response(theta, windows)[0] - measured).ravel()
+
+    def jacobian(theta):
+        return window_response(theta, windows)[1].reshape(-1, len(theta))
+
+    result = least_squares(residuals, theta0, jac=jacobian, loss=loss, max_nfev=max_nfev, x_scale='jac',
+                           bounds=([1e-6, 1e-6, 0.0, -50.0], [np.inf, np.inf, np.inf, 100.0]))
+    volume, heat_capacity, heat_loss, ambient = result.x
+    return {
+        'parameters': {
+            'volume': float(volume),
+            'cp': float(heat_capacity / simulator.rho),
+            'rho': float(simulator.rho),
+            'heat_loss': float(heat_loss),
+            'ambient_temperature': float(ambient)
+        },
+        'rmse': float(np.sqrt(np.mean(result.fun**2))),
+        'n_windows': len(measured),
+        'nfev': int(result.nfev),
+        'success': bool(result.success),
+        'elapsed': time.perf_counter() - start
+    }
+
+def apply_calibration(simulator, parameters):
+    """Set calibrated constants on a simulator and return it"""
+    for name, value in parameters.items():
+        setattr(simulator, name, value)
+    return simulator
+
+class CalibrationStore:
+    """
+    Calibrated parameter sets per industrial unit, kept in one JSON file
+    Every save rewrites the file atomically; without a path the calibrations
+    are only kept in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = None if path is None else str(path)
+        self.entries = {}
+
+    def _read(self):
+        if self.path is None:
+            return dict(self.entries)
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def units(self):
+        """Units with a calibration"""
+        return sorted(self._read())
+
+    def save(self, unit, calibration):
+        """Store the result of calibrate() for a unit"""
+        entries = self._read()
+        entries[str(unit)] = {
+            'parameters': calibration['parameters'],
+            'rmse': calibration['rmse'],
+            'n_windows': calibration['n_windows'],
+            'calibrated_at': datetime.now().isoformat(timespec='seconds')
+        }
+        if self.path is None:
+            self.entries = entries
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        os.replace(temporary, self.path)
+
+    def load(self, unit):
+        """Stored calibration of a unit, or None"""
+        return self._read().get(str(unit))
+
+    def simulator(self, unit):
+        """ProcessSimulator with the unit's calibrated constants (nominal ones when not calibrated)"""
+        simulator = ProcessSimulator()
+        entry = self.load(unit)
+        if entry is not None:
+            apply_calibration(simulator, entry['parameters'])
+        return simulator
+
+# Process-wide store shared by the pages (persisted only when CALIBRATION_PATH is set)
+CALIBRATION_STORE = CalibrationStore(os.environ.get('CALIBRATION_PATH'))
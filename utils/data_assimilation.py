@@ -0,0 +1,150 @@
+import time
+from collections import deque
+import numpy as np
+from scipy.integrate import odeint
+from utils.simulation import DEFAULT_PARAMETERS, ProcessSimulator
+
+# Inputs of ProcessSimulator.energy_balance that the filter can estimate as
+# augmented states (random-walk model) instead of reading them from sensors
+ESTIMABLE_INPUTS = ('heat_input', 'inlet_temperature', 'flow_rate')
+
+class EnsembleKalmanFilter:
+    """
+    Ensemble Kalman filter tracking the measured temperature of many units
+    The ensemble is one array (units x members x states): the temperature
+    followed by the estimated inputs of the energy balance. Every step
+    propagates all members of all units at once and assimilates one
+    temperature reading per unit (stochastic EnKF with perturbed observations;
+    the scalar observation makes the gain a division, no matrix inversion).
+
+    simulator: ProcessSimulator providing the energy balance
+    n_units, n_members: units filtered together and ensemble size
+    estimate: inputs estimated by the filter (see ESTIMABLE_INPUTS); the other
+        inputs are read from step() or kept at their initial value
+    initial, initial_std: dicts of initial mean and spread per state or input
+    process_std: dict of random-walk standard deviation per state and second
+    measurement_std: temperature sensor noise (°C)
+    inflation: multiplicative inflation of the ensemble anomalies
+    latency_window: number of steps kept for the latency statistics
+    """
+
+    def __init__(self, simulator=None, n_units=1, n_members=200, estimate=('heat_input',), initial=None,
+                 initial_std=None, process_std=None, measurement_std=0.5, inflation=1.0, latency_window=1000,
+                 seed=None):
+        self.simulator = simulator or ProcessSimulator()
+        self.n_units = n_units
+        self.n_members = n_members
+        self.states = ('temperature',) + tuple(estimate)
+        self.measurement_std = measurement_std
+        self.inflation = inflation
+        self.rng = np.random.default_rng(seed)
+
+        initial = {**DEFAULT_PARAMETERS, **(initial or {})}
+        initial_std = {'temperature': 1.0, 'heat_input': 100.0, 'inlet_temperature': 2.0, 'flow_rate': 5.0,
+                       **(initial_std or {})}
+        self.process_std = {'temperature': 0.05, 'heat_input': 1.0, 'inlet_temperature': 0.01, 'flow_rate': 0.05,
+                            **(process_std or {})}
+
+        shape = (n_units, n_members)
+        self.ensemble = np.stack([
+            np.asarray(initial[name], dtype=np.float64).reshape(-1, 1)
+            + initial_std[name] * self.rng.standard_normal(shape)
+            for name in self.states
+        ], axis=-1)
+        # Inputs read from sensors, one value per unit
+        self.inputs = {name: np.broadcast_to(np.asarray(initial[name], dtype=np.float64), (n_units,)).copy()
+                       for name in ESTIMABLE_INPUTS if name not in self.states}
+        self.latencies = deque(maxlen=latency_window)
+
+    def _input(self, name):
+        """Input of the energy balance as a (units x members) broadcastable array"""
+        if name in self.states:
+            return self.ensemble[..., self.states.index(name)]
+        return self.inputs[name][:, None]
+
+    def forecast(self, dt):
+        """Propagate every member over dt seconds and add the process noise"""
+        T = self.ensemble[..., 0]
+        Q_in, T_in, flow = (self._input(name) for name in ('heat_input', 'inlet_temperature', 'flow_rate'))
+        if self.simulator.has_linear_energy_balance():
+            T = self.simulator.analytical_temperature(dt, T, Q_in, T_in, flow)
+        else:
+            # Independent members: diagonal Jacobian, as in ProcessSimulator.step
+            args = tuple(np.broadcast_to(a, T.shape).ravel() for a in (Q_in, T_in, flow))
+            T = odeint(self.simulator.energy_balance, T.ravel(), [0.0, dt], args=args,
+                       ml=0, mu=0)[-1].reshape(T.shape)
+        self.ensemble[..., 0] = T
+
+        noise = np.array([self.process_std[name] for name in self.states]) * np.sqrt(dt)
+        self.ensemble += noise * self.rng.standard_normal(self.ensemble.shape)
+
+    def assimilate(self, measurements):
+        """
+        Update the ensemble with one temperature reading per unit
+        measurements: array (units,), NaN for units without a reading
+        """
+        measurements = np.asarray(measurements, dtype=np.float64).reshape(self.n_units)
+        mean = self.ensemble.mean(axis=1, keepdims=True)
+        anomalies = self.inflation * (self.ensemble - mean)
+        self.ensemble = mean + anomalies
+
+        predicted = self.ensemble[..., 0]
+        observed_anomalies = anomalies[..., 0]
+        covariance = np.einsum('umk,um->uk', anomalies, observed_anomalies) / (self.n_members - 1)
+        variance = (observed_anomalies**2).sum(axis=1) / (self.n_members - 1) + self.measurement_std**2
+        gain = covariance / variance[:, None]
+
+        perturbed = measurements[:, None] + self.measurement_std * self.rng.standard_normal(predicted.shape)
+        innovation = np.where(np.isnan(perturbed), 0.0, perturbed - predicted)
+        self.ensemble += gain[:, None, :] * innovation[..., None]
+
+    def step(self, dt, measurements, inputs=None):
+        """
+        Forecast over dt seconds, then assimilate the readings
+        inputs: optional dict of measured inputs (one value per unit)
+        Returns the estimate after the update.
+        """
+        start = time.perf_counter()
+        if inputs:
+            for name, value in inputs.items():
+                if name in self.inputs:
+                    self.inputs[name][:] = value
+        self.forecast(dt)
+        self.assimilate(measurements)
+        estimate = self.estimate()
+        self.latencies.append(time.perf_counter() - start)
+        return estimate
+
+    def run(self, measurements, dt=1.0, inputs=None):
+        """
+        Filter a batch of readings
+        measurements: array (steps x units)
+        inputs: optional dict of measured inputs, arrays (steps x units)
+        Returns a dict of state -> (mean, std) arrays (steps x units).
+        """
+        measurements = np.asarray(measurements, dtype=np.float64).reshape(-1, self.n_units)
+        history = {name: (np.empty(measurements.shape), np.empty(measurements.shape)) for name in self.states}
+        for i, reading in enumerate(measurements):
+            step_inputs = {name: values[i] for name, values in inputs.items()} if inputs else None
+            for name, (mean, std) in self.step(dt, reading, step_inputs).items():
+                history[name][0][i] = mean
+                history[name][1][i] = std
+        return history
+
+    def estimate(self):
+        """Ensemble mean and standard deviation of every state, arrays (units,)"""
+        mean = self.ensemble.mean(axis=1)
+        std = self.ensemble.std(axis=1, ddof=1)
+        return {name: (mean[:, i], std[:, i]) for i, name in enumerate(self.states)}
+
+    def latency(self):
+        """Per-step latency over the last steps (milliseconds)"""
+        if not self.latencies:
+            return {'steps': 0, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        latencies = np.array(self.latencies) * 1000
+        return {
+            'steps': len(latencies),
+            'mean_ms': float(latencies.mean()),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'max_ms': float(latencies.max())
+        }
@@ -1,33 +1,73 @@
 import numpy as np
-from datetime import datetime, timedelta
+import pandas as pd
+from datetime import datetime
+
+# Sensor channels: (mean, standard deviation) of each simulated reading
+SENSOR_CHANNELS = {
+    'temperature': (150, 10),          # °C
+    'pressure': (2.5, 0.2),            # bar
+    'flow_rate': (100, 5),             # m³/h
+    'energy_consumption': (500, 50),   # kWh
+    'product_quality': (0.95, 0.02),   # %
+    'raw_material_input': (1000, 50),  # kg
+    'product_output': (950, 45),       # kg
+    'waste_generated': (50, 5),        # kg
+    'co2_emissions': (200, 20),        # kg
+    'water_consumption': (5000, 500),  # L
+    'maintenance_hours': (8, 1),       # hours
+    'production_cost': (1000, 100),    # €
+}
+
+# Display labels of the sensor channels
+CHANNEL_LABELS = {
+    'temperature': "Température",
+    'pressure': "Pression",
+    'flow_rate': "Débit",
+    'energy_consumption': "Consommation énergétique",
+    'product_quality': "Qualité du produit",
+    'raw_material_input': "Matière première",
+    'product_output': "Production",
+    'waste_generated': "Déchets",
+    'co2_emissions': "Émissions CO2",
+    'water_consumption': "Consommation d'eau",
+    'maintenance_hours': "Heures de maintenance",
+    'production_cost': "Coût de production",
+}
 
 def generate_sample_data():
     """Generate sample industrial data for demonstration"""
-    return {
-        'timestamp': datetime.now(),
-        'temperature': np.random.normal(150, 10),  # °C
-        'pressure': np.random.normal(2.5, 0.2),    # bar
-        'flow_rate': np.random.normal(100, 5),     # m³/h
-        'energy_consumption': np.random.normal(500, 50),  # kWh
-        'product_quality': np.random.normal(0.95, 0.02),  # %
-        'raw_material_input': np.random.normal(1000, 50),  # kg
-        'product_output': np.random.normal(950, 45),      # kg
-        'waste_generated': np.random.normal(50, 5),       # kg
-        'co2_emissions': np.random.normal(200, 20),       # kg
-        'water_consumption': np.random.normal(5000, 500), # L
-        'maintenance_hours': np.random.normal(8, 1),      # hours
-        'production_cost': np.random.normal(1000, 100),   # €
+    sample = {'timestamp': datetime.now()}
+    for channel, (mean, std) in SENSOR_CHANNELS.items():
+        sample[channel] = np.random.normal(mean, std)
+    return sample
+
+def generate_historical_frame(days=30, freq='h', start=None, end=None, rng=None, dtype=np.float64):
+    """
+    Generate historical data as a columnar DataFrame
+    days: horizon in days, used when start/end are not both given
+    freq: pandas frequency string of the readings ('h', '15min', 'min', ...)
+    start, end: optional bounds of the time range (end excluded)
+    rng: np.random.Generator or seed, for reproducible series
+    dtype: float dtype of the sensor columns
+    """
+    rng = np.random.default_rng(rng)
+
+    if end is None:
+        end = pd.Timestamp(start) + pd.Timedelta(days=days) if start is not None else datetime.now()
+    if start is None:
+        start = pd.Timestamp(end) - pd.Timedelta(days=days)
+
+    index = pd.date_range(start, end, freq=freq, inclusive='left', name='timestamp')
+    n = len(index)
+
+    # One vectorized draw per channel
+    columns = {
+        channel: rng.normal(mean, std, n).astype(dtype, copy=False)
+        for channel, (mean, std) in SENSOR_CHANNELS.items()
     }
+    return pd.DataFrame(columns, index=index)
 
 def generate_historical_data(days=30):
     """Generate historical data for trend analysis"""
-    data = []
-    start_date = datetime.now() - timedelta(days=days)
-    
-    for i in range(days * 24):  # Hourly data
-        timestamp = start_date + timedelta(hours=i)
-        sample = generate_sample_data()
-        sample['timestamp'] = timestamp
-        data.append(sample)
-    
-    return data
+    frame = generate_historical_frame(days, freq='h')
+    return frame.reset_index().to_dict('records')
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import math
+import time
+import numpy as np
+import pandas as pd
+from utils.data_generator import SENSOR_CHANNELS, generate_historical_frame
+
+logger = logging.getLogger(__name__)
+
+def validate_reading(reading):
+    """
+    Check one received reading: a JSON object with a timestamp and a finite
+    number for every sensor channel
+    Returns the reading; raises ValueError when it cannot go into a batch.
+    """
+    if not isinstance(reading, dict):
+        raise ValueError("Reading is not an object")
+    if pd.isna(pd.Timestamp(reading.get('timestamp'))):
+        raise ValueError("Missing timestamp")
+    for channel in SENSOR_CHANNELS:
+        value = reading.get(channel)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"Invalid or missing sensor channel '{channel}'")
+    return reading
+
+def readings_to_frame(readings):
+    """Convert a list of reading dicts into a batch DataFrame indexed by timestamp"""
+    frame = pd.DataFrame.from_records(readings)
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    return normalize_batch(frame)
+
+def normalize_batch(frame):
+    """Return a batch with the sensor schema: timestamp index and float channels"""
+    if 'timestamp' in frame.columns:
+        frame = frame.set_index('timestamp')
+    frame.index = pd.DatetimeIndex(frame.index, name='timestamp')
+    missing = [channel for channel in SENSOR_CHANNELS if channel not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing sensor channels: {', '.join(missing)}")
+    return frame[list(SENSOR_CHANNELS)].astype(np.float64)
+
+class DataSource:
+    """
+    Base class of sensor data sources
+    Subclasses implement batches(), an async generator of DataFrames
+    (timestamp index, one column per sensor channel) for one unit.
+    """
+
+    def __init__(self, unit, batch_size=100):
+        self.unit = unit
+        self.batch_size = batch_size
+
+    async def batches(self):
+        raise NotImplementedError
+        yield
+
+    def __aiter__(self):
+        return self.batches()
+
+class SyntheticSource(DataSource):
+    """
+    Synthetic readings from utils.data_generator
+    interval: seconds between readings
+    realtime: wait between batches so readings arrive at their own pace
+    limit: number of readings to produce (endless when None)
+    """
+
+    def __init__(self, unit, interval=1.0, batch_size=100, realtime=True, limit=None, rng=None, start=None):
+        super().__init__(unit, batch_size)
+        self.interval = interval
+        self.realtime = realtime
+        self.limit = limit
+        self.rng = np.random.default_rng(rng)
+        self.start = pd.Timestamp(start) if start is not None else pd.Timestamp.now()
+
+    async def batches(self):
+        freq = pd.Timedelta(seconds=self.interval)
+        produced = 0
+        next_start = self.start
+        while self.limit is None or produced < self.limit:
+            size = self.batch_size if self.limit is None else min(self.batch_size, self.limit - produced)
+            batch = generate_historical_frame(
+                start=next_start, end=next_start + size * freq, freq=freq, rng=self.rng
+            )
+            produced += size
+            next_start += size * freq
+            if self.realtime:
+                await asyncio.sleep(size * self.interval)
+            else:
+                await asyncio.sleep(0)
+            yield batch
+
+class ReplaySource(DataSource):
+    """
+    Replay of recorded readings from a CSV or Parquet file
+    speedup: replay speed relative to the recorded timestamps (None replays as fast as possible)
+    unit_column: optional column used to keep only this unit's readings
+    """
+
+    def __init__(self, unit, path, speedup=1.0, batch_size=100, unit_column=None):
+        super().__init__(unit, batch_size)
+        self.path = str(path)
+        self.speedup = speedup
+        self.unit_column = unit_column
+
+    def _chunks(self):
+        """Read the file in chunks of batch_size rows"""
+        if self.path.endswith('.parquet'):
+            frame = pd.read_parquet(self.path)
+            for start in range(0, len(frame), self.batch_size):
+                yield frame.iloc[start:start + self.batch_size]
+        else:
+            yield from pd.read_csv(self.path, chunksize=self.batch_size, parse_dates=['timestamp'])
+
+    async def batches(self):
+        first_timestamp = None
+        started = time.monotonic()
+        for chunk in self._chunks():
+            if self.unit_column is not None:
+                chunk = chunk[chunk[self.unit_column] == self.unit]
+                if chunk.empty:
+                    continue
+            batch = normalize_batch(chunk.copy())
+            if self.speedup:
+                # Release the batch once its last reading is due on the replay clock
+                if first_timestamp is None:
+                    first_timestamp = batch.index[0]
+                due = (batch.index[-1] - first_timestamp).total_seconds() / self.speedup
+                await asyncio.sleep(max(0.0, due - (time.monotonic() - started)))
+            else:
+                await asyncio.sleep(0)
+            yield batch
+
+class _BatchingSource(DataSource):
+    """Source fed by a network protocol through a bounded queue of readings"""
+
+    def __init__(self, unit, host, port, batch_size=100, max_latency=0.5, max_pending=10000):
+        super().__init__(unit, batch_size)
+        self.host = host
+        self.port = port
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue(max_pending)
+        self.dropped = 0
+
+    def _readings(self, payload):
+        """
+        Valid readings of this unit in one JSON message (object or list of objects)
+        Undecodable messages and invalid readings are counted in self.dropped.
+        """
+        try:
+            readings = json.loads(payload)
+        except ValueError:
+            self.dropped += 1
+            return []
+        if not isinstance(readings, list):
+            readings = [readings]
+        accepted = []
+        for reading in readings:
+            try:
+                validate_reading(reading)
+            except (ValueError, TypeError):
+                self.dropped += 1
+                continue
+            if self.unit is None or reading.get('unit', self.unit) == self.unit:
+                accepted.append(reading)
+        return accepted
+
+    def _accept(self, payload):
+        """Queue the valid readings of one JSON message, dropping them when the queue is full"""
+        for reading in self._readings(payload):
+            try:
+                self.queue.put_nowait(reading)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def _collect(self):
+        """Wait for a batch: full, or whatever arrived within max_latency"""
+        readings = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(readings) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                readings.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return readings_to_frame(readings)
+
+class UDPSource(_BatchingSource):
+    """
+    Readings received as JSON datagrams on a local UDP port
+    UDP cannot slow the sender down: when the queue is full, readings are
+    dropped and counted in self.dropped.
+    """
+
+    async def batches(self):
+        loop = asyncio.get_running_loop()
+        source = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                source._accept(data)
+
+        transport, _ = await loop.create_datagram_endpoint(Protocol, local_addr=(self.host, self.port))
+        try:
+            while True:
+                yield await self._collect()
+        finally:
+            transport.close()
+
+class SocketSource(_BatchingSource):
+    """
+    Readings received as newline-delimited JSON on a local TCP port
+    Connections are read only while the queue has room, so a slow consumer
+    pushes back on the senders through TCP flow control.
+    """
+
+    async def _handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                for reading in self._readings(line):
+                    await self.queue.put(reading)
+        except (ConnectionError, ValueError) as error:
+            # readline() reports a line over the stream limit as ValueError
+            logger.warning("Connection of unit %s closed: %s", self.unit, error)
+        finally:
+            writer.close()
+
+    async def batches(self):
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        try:
+            while True:
+                yield await self._collect()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+async def ingest(sources, sink, max_pending=64):
+    """
+    Run many sources concurrently in the current event loop
+    sink: callable(unit, batch) called for every batch (may be a coroutine function)
+    max_pending: batches buffered between the sources and the sink; when full,
+    sources wait, which propagates backpressure to them.
+    A source that fails is logged and stops on its own; the other sources go on.
+    Returns the number of readings ingested per unit.
+    """
+    queue = asyncio.Queue(max_pending)
+    done = object()
+    counts = {source.unit: 0 for source in sources}
+
+    async def pump(source):
+        try:
+            async for batch in source.batches():
+                await queue.put((source.unit, batch))
+        except Exception:
+            logger.exception("Data source of unit %s failed", source.unit)
+        await queue.put(done)
+
+    tasks = [asyncio.create_task(pump(source)) for source in sources]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+                continue
+            unit, batch = item
+            result = sink(unit, batch)
+            if asyncio.iscoroutine(result):
+                await result
+            counts[unit] += len(batch)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return counts
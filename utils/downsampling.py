@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+def _as_float(x):
+    """Return x as float64 values (datetimes as nanoseconds)"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+    Returns the indices of the n_out points kept (first and last always kept).
+    The area of every candidate in a bucket is computed in one array operation.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+    # Interior buckets, the first and last points being buckets of their own
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    # Mean of every bucket, used as the third vertex of the triangles
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, y[-1])
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        kept[i + 1] = a
+    return kept
+
+def minmax_indices(y, n_out):
+    """
+    Min/max envelope downsampling
+    Splits the series into n_out // 2 buckets and keeps the minimum and the
+    maximum of each one, in time order, so peaks are never lost.
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    size = int(np.diff(edges).max())
+    # Pad the buckets to the same length to reduce them as one 2-D array
+    positions = edges[:-1, None] + np.arange(size)
+    valid = positions < edges[1:, None]
+    positions = np.where(valid, positions, edges[:-1, None])
+    values = y[positions]
+    low = np.where(valid, values, np.inf)
+    high = np.where(valid, values, -np.inf)
+    rows = np.arange(n_buckets)
+    first = positions[rows, np.argmin(low, axis=1)]
+    second = positions[rows, np.argmax(high, axis=1)]
+    return np.unique(np.concatenate([first, second]))
+
+def downsample(x, y, max_points, mode='lttb'):
+    """Downsample one series to at most max_points points, returns (x, y)"""
+    if mode == 'lttb':
+        indices = lttb_indices(x, y, max_points)
+    elif mode == 'minmax':
+        indices = minmax_indices(y, max_points)
+    else:
+        raise ValueError(f"Unknown downsampling mode '{mode}'")
+    return np.asarray(x)[indices], np.asarray(y)[indices]
+
+def downsample_frame(data, x, columns, max_points=2000, mode='lttb', start=None, end=None):
+    """
+    Downsample several series of a DataFrame for a line chart
+    Only the visible range [start, end] is considered, so zooming in on a
+    narrower range returns it at full resolution once it fits in max_points.
+    Returns a long DataFrame (x, 'variable', 'value') ready for px.line(color='variable').
+    """
+    if start is not None:
+        data = data[data[x] >= start]
+    if end is not None:
+        data = data[data[x] <= end]
+
+    pieces = []
+    for column in columns:
+        xs, ys = downsample(data[x].to_numpy(), data[column].to_numpy(), max_points, mode)
+        pieces.append(pd.DataFrame({x: xs, 'variable': column, 'value': ys}))
+    return pd.concat(pieces, ignore_index=True)
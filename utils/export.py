@@ -0,0 +1,179 @@
+import atexit
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import pandas as pd
+
+# Export formats: (file extension, MIME type)
+EXPORT_FORMATS = {
+    'xlsx': ('xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'csv.gz': ('csv.gz', "application/gzip"),
+    'parquet': ('parquet', "application/vnd.apache.parquet")
+}
+
+# Rows per chunk when streaming CSV and Parquet exports
+CHUNK_ROWS = 100000
+
+# Above this many rows, XLSX sheets are written with xlsxwriter's constant_memory mode
+CONSTANT_MEMORY_ROWS = 50000
+
+def dataset_version(frame, *extra):
+    """Cheap version token of a DataFrame: shape, columns and last index value"""
+    last = frame.index[-1] if len(frame) else None
+    return (len(frame), tuple(frame.columns), last) + extra
+
+def iter_chunks(frame, chunk_rows=CHUNK_ROWS):
+    """Yield consecutive row slices of a DataFrame (views, no copies)"""
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+def write_csv_gzip(frame, fileobj, chunk_rows=CHUNK_ROWS):
+    """Write a DataFrame as gzip CSV one chunk at a time"""
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as gz:
+        text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+        for i, chunk in enumerate(iter_chunks(frame, chunk_rows)):
+            chunk.to_csv(text, index=False, header=(i == 0))
+        text.flush()
+        text.detach()
+
+def write_parquet(frame, fileobj, chunk_rows=CHUNK_ROWS):
+    """Write a DataFrame as Parquet, one row group per chunk (requires pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("L'export Parquet nécessite le paquet 'pyarrow'") from error
+
+    writer = None
+    try:
+        for chunk in iter_chunks(frame, chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(fileobj, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _write_sheet(workbook, name, frame, index=True):
+    """Write a DataFrame row by row, as required by constant_memory mode"""
+    worksheet = workbook.add_worksheet(name)
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    header = ([frame.index.name or ''] if index else []) + [str(column) for column in frame.columns]
+    worksheet.write_row(0, 0, header)
+
+    row = 1
+    for chunk in iter_chunks(frame):
+        values = chunk.reset_index() if index else chunk
+        for record in values.itertuples(index=False, name=None):
+            for i, value in enumerate(record):
+                if isinstance(value, datetime):
+                    if not pd.isna(value):
+                        worksheet.write_datetime(row, i, value, date_format)
+                elif not pd.isna(value):
+                    worksheet.write(row, i, value)
+            row += 1
+
+def write_kpi_excel(frame, fileobj):
+    """
+    Write the KPI workbook: raw data, statistics and latest reading
+    Large sheets are streamed with xlsxwriter's constant_memory mode.
+    """
+    import xlsxwriter
+
+    options = {'constant_memory': len(frame) > CONSTANT_MEMORY_ROWS, 'nan_inf_to_errors': True}
+    workbook = xlsxwriter.Workbook(fileobj, options)
+    try:
+        _write_sheet(workbook, 'Données brutes', frame, index=False)
+        _write_sheet(workbook, 'Statistiques', frame.describe())
+        _write_sheet(workbook, 'Dernier relevé', frame.iloc[-1:].T.rename(columns=str))
+    finally:
+        workbook.close()
+
+WRITERS = {
+    'xlsx': write_kpi_excel,
+    'csv.gz': write_csv_gzip,
+    'parquet': write_parquet
+}
+
+class ExportCache:
+    """
+    Exports built on demand and kept on disk, keyed by (name, version, format)
+    Least recently used files are deleted once max_bytes is exceeded, and the
+    remaining ones when the process exits (the whole directory when the cache
+    created it).
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, directory=None):
+        self.max_bytes = max_bytes
+        self.owns_directory = directory is None
+        self.directory = tempfile.mkdtemp(prefix='exports-') if directory is None else directory
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get(self, key):
+        """Path of a cached export, or None"""
+        with self.lock:
+            path = self.entries.get(key)
+            if path is not None and os.path.exists(path):
+                self.entries.move_to_end(key)
+                return path
+            self.entries.pop(key, None)
+            return None
+
+    def build(self, key, frame, export_format):
+        """Write the export to a file (once per key) and return its path"""
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        extension = EXPORT_FORMATS[export_format][0]
+        fd, path = tempfile.mkstemp(suffix=f".{extension}", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fileobj:
+                WRITERS[export_format](frame, fileobj)
+        except BaseException:
+            os.remove(path)
+            raise
+
+        with self.lock:
+            # Another session may have built the same export meanwhile: keep its file
+            existing = self.entries.get(key)
+            if existing is not None and os.path.exists(existing):
+                self.entries.move_to_end(key)
+                os.remove(path)
+                return existing
+            self.entries[key] = path
+            self._evict()
+        return path
+
+    def _evict(self):
+        total = sum(os.path.getsize(path) for path in self.entries.values() if os.path.exists(path))
+        while total > self.max_bytes and len(self.entries) > 1:
+            _, path = self.entries.popitem(last=False)
+            if os.path.exists(path):
+                total -= os.path.getsize(path)
+                os.remove(path)
+
+    def clear(self):
+        """Delete every cached export"""
+        with self.lock:
+            for path in self.entries.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            self.entries.clear()
+
+    def close(self):
+        """Delete every cached export, and the cache directory when the cache created it"""
+        self.clear()
+        if self.owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+# Process-wide cache shared by the pages
+EXPORT_CACHE = ExportCache()
@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+from utils.kpi_calculator import compile_kpi_plan, evaluate_kpi_plan
+
+# Rolling windows in seconds
+DEFAULT_WINDOWS = {
+    '1h': 3600,
+    '8h': 8 * 3600,
+    '24h': 24 * 3600,
+    '30j': 30 * 24 * 3600
+}
+
+def _timestamp_seconds(timestamp):
+    """Convert a datetime-like timestamp to seconds"""
+    return pd.Timestamp(timestamp).value / 1e9
+
+class RollingWindow:
+    """
+    Time window split into a ring of buckets
+    Each bucket keeps Welford statistics (count, mean, M2), min/max and a
+    log-spaced histogram per KPI, so updates are O(1) and memory is fixed.
+    Expiry has the granularity of one bucket (length / n_buckets).
+    """
+
+    def __init__(self, length, n_kpis, n_buckets=60, bin_edges=None):
+        self.length = length
+        self.n_buckets = n_buckets
+        self.bucket_width = length / n_buckets
+        self.bin_edges = bin_edges
+
+        self.bucket_ids = np.full(n_buckets, -1, dtype=np.int64)
+        self.count = np.zeros((n_buckets, n_kpis), dtype=np.int64)
+        self.mean = np.zeros((n_buckets, n_kpis))
+        self.m2 = np.zeros((n_buckets, n_kpis))
+        self.min = np.full((n_buckets, n_kpis), np.inf)
+        self.max = np.full((n_buckets, n_kpis), -np.inf)
+        self.histogram = np.zeros((n_buckets, n_kpis, len(bin_edges) - 1), dtype=np.int32)
+        self.last_bucket = -1
+
+    def _slot(self, bucket_id):
+        """Return the ring slot of a bucket, recycling it if it holds expired data"""
+        slot = bucket_id % self.n_buckets
+        if self.bucket_ids[slot] != bucket_id:
+            self.bucket_ids[slot] = bucket_id
+            self.count[slot] = 0
+            self.mean[slot] = 0.0
+            self.m2[slot] = 0.0
+            self.min[slot] = np.inf
+            self.max[slot] = -np.inf
+            self.histogram[slot] = 0
+        return slot
+
+    def update(self, seconds, values, bins):
+        """Add one vector of KPI values (one per KPI) observed at `seconds`"""
+        bucket_id = int(seconds // self.bucket_width)
+        self.last_bucket = max(self.last_bucket, bucket_id)
+        if bucket_id <= self.last_bucket - self.n_buckets:
+            return  # Too late for this window
+        slot = self._slot(bucket_id)
+
+        valid = np.isfinite(values)
+        x = np.where(valid, values, 0.0)
+        count = self.count[slot] + valid
+        delta = x - self.mean[slot]
+        mean = self.mean[slot] + np.where(valid, delta / np.maximum(count, 1), 0.0)
+        self.m2[slot] += np.where(valid, delta * (x - mean), 0.0)
+        self.mean[slot] = mean
+        self.count[slot] = count
+        self.min[slot] = np.where(valid, np.minimum(self.min[slot], x), self.min[slot])
+        self.max[slot] = np.where(valid, np.maximum(self.max[slot], x), self.max[slot])
+        kpi_index = np.flatnonzero(valid)
+        self.histogram[slot, kpi_index, bins[kpi_index]] += 1
+
+    def update_batch(self, seconds, values, bins):
+        """
+        Add many vectors of KPI values at once
+        seconds: (n,) observation times; values, bins: (n, n_kpis)
+        Rows are grouped by bucket and every group is merged into its bucket in
+        one step (Chan et al. merge of the Welford states), which gives the
+        same statistics as adding the rows one by one.
+        """
+        bucket_ids = (seconds // self.bucket_width).astype(np.int64)
+        if not len(bucket_ids):
+            return
+        self.last_bucket = max(self.last_bucket, int(bucket_ids.max()))
+        keep = bucket_ids > self.last_bucket - self.n_buckets  # Too late for this window otherwise
+        bucket_ids, values, bins = bucket_ids[keep], values[keep], bins[keep]
+        if not len(bucket_ids):
+            return
+
+        order = np.argsort(bucket_ids, kind='stable')
+        bucket_ids, values, bins = bucket_ids[order], values[order], bins[order]
+        buckets, starts, group = np.unique(bucket_ids, return_index=True, return_inverse=True)
+
+        # Statistics of every group
+        valid = np.isfinite(values)
+        x = np.where(valid, values, 0.0)
+        count = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+        mean = np.add.reduceat(x, starts, axis=0) / np.maximum(count, 1)
+        m2 = np.add.reduceat(np.where(valid, (x - mean[group]) ** 2, 0.0), starts, axis=0)
+        low = np.minimum.reduceat(np.where(valid, x, np.inf), starts, axis=0)
+        high = np.maximum.reduceat(np.where(valid, x, -np.inf), starts, axis=0)
+
+        # Recycle the slots holding expired buckets
+        slots = buckets % self.n_buckets
+        stale = slots[self.bucket_ids[slots] != buckets]
+        self.bucket_ids[slots] = buckets
+        self.count[stale] = 0
+        self.mean[stale] = 0.0
+        self.m2[stale] = 0.0
+        self.min[stale] = np.inf
+        self.max[stale] = -np.inf
+        self.histogram[stale] = 0
+
+        # Merge the groups into their buckets
+        previous = self.count[slots]
+        total = previous + count
+        delta = mean - self.mean[slots]
+        self.mean[slots] += delta * count / np.maximum(total, 1)
+        self.m2[slots] += m2 + delta ** 2 * previous * count / np.maximum(total, 1)
+        self.count[slots] = total
+        self.min[slots] = np.minimum(self.min[slots], low)
+        self.max[slots] = np.maximum(self.max[slots], high)
+        rows, kpi_index = np.nonzero(valid)
+        np.add.at(self.histogram, (slots[group[rows]], kpi_index, bins[rows, kpi_index]), 1)
+
+    def statistics(self, quantiles, now=None):
+        """Merge the live buckets into per-KPI statistics"""
+        current = self.last_bucket if now is None else int(now // self.bucket_width)
+        live = (self.bucket_ids > current - self.n_buckets) & (self.bucket_ids <= current)
+
+        count = self.count[live]
+        n = count.sum(axis=0)
+        safe_n = np.maximum(n, 1)
+        # Chan et al. merge of the bucket Welford states
+        mean = (count * self.mean[live]).sum(axis=0) / safe_n
+        m2 = (self.m2[live] + count * (self.mean[live] - mean) ** 2).sum(axis=0)
+        std = np.sqrt(m2 / np.maximum(n - 1, 1))
+
+        stats = {
+            'count': n,
+            'mean': np.where(n > 0, mean, np.nan),
+            'std': np.where(n > 1, std, np.nan),
+            'min': np.where(n > 0, self.min[live].min(axis=0, initial=np.inf), np.nan),
+            'max': np.where(n > 0, self.max[live].max(axis=0, initial=-np.inf), np.nan)
+        }
+
+        # Approximate quantiles from the merged histogram (geometric bin centers)
+        cumulative = self.histogram[live].sum(axis=0).cumsum(axis=1)
+        centers = np.sqrt(self.bin_edges[:-1] * self.bin_edges[1:])
+        for q in quantiles:
+            rank = np.ceil(q * n).clip(min=1)
+            index = (cumulative < rank[:, None]).sum(axis=1).clip(max=len(centers) - 1)
+            value = np.clip(centers[index], stats['min'], stats['max'])
+            stats[f'p{round(q * 100):g}'] = np.where(n > 0, value, np.nan)
+        return stats
+
+class RollingKPIAggregator:
+    """
+    Incremental rolling statistics of KPIs for one unit
+    windows: dict of window label -> length in seconds
+    kpis: KPI names to aggregate, all registered KPIs when None
+    n_buckets: buckets per window (expiry granularity)
+    quantiles: quantiles reported by snapshot()
+    relative_accuracy: relative bin width of the quantile sketch
+    value_range: (min, max) of positive values covered by the sketch
+    """
+
+    def __init__(self, windows=None, kpis=None, n_buckets=30, quantiles=(0.5, 0.95),
+                 relative_accuracy=0.02, value_range=(1e-3, 1e5)):
+        self.windows_config = dict(windows or DEFAULT_WINDOWS)
+        self.plan = compile_kpi_plan(kpis)
+        self.kpis = self.plan['kpis']
+        self.quantiles = tuple(quantiles)
+
+        # Log-spaced bin edges: each bin spans the same relative width,
+        # the first bin also collects values below the range
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        n_bins = int(np.ceil(np.log(value_range[1] / value_range[0]) / np.log(gamma)))
+        self.bin_edges = value_range[0] * gamma ** np.arange(n_bins + 1)
+        self.bin_edges[0] = 0.0
+        self._log_min = np.log(value_range[0])
+        self._log_gamma = np.log(gamma)
+        self._n_bins = n_bins
+
+        self.windows = {
+            label: RollingWindow(length, len(self.kpis), n_buckets, self.bin_edges)
+            for label, length in self.windows_config.items()
+        }
+        self.last_timestamp = None
+
+    def _bins(self, values):
+        """Histogram bin of each value"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            index = np.floor((np.log(values) - self._log_min) / self._log_gamma)
+        return np.nan_to_num(index, nan=0, neginf=0).clip(0, self._n_bins - 1).astype(np.int64)
+
+    def update(self, reading):
+        """Add one reading shaped like generate_sample_data()"""
+        kpis = evaluate_kpi_plan(self.plan, reading)
+        values = np.array([kpis[name] for name in self.kpis], dtype=np.float64)
+        self.add_values(reading['timestamp'], values)
+
+    def update_frame(self, frame):
+        """Add a DataFrame of readings indexed (or with a column) by timestamp"""
+        if 'timestamp' in frame.columns:
+            frame = frame.set_index('timestamp')
+        if frame.empty:
+            return
+        kpis = evaluate_kpi_plan(self.plan, frame)
+        values = np.column_stack([np.broadcast_to(np.asarray(kpis[name], dtype=np.float64), len(frame))
+                                  for name in self.kpis])
+        seconds = pd.DatetimeIndex(frame.index).as_unit('ns').asi8 / 1e9
+        bins = self._bins(values)
+        for window in self.windows.values():
+            window.update_batch(seconds, values, bins)
+        self.last_timestamp = frame.index[-1]
+
+    def add_values(self, timestamp, values):
+        """Add a vector of KPI values (ordered like self.kpis)"""
+        seconds = _timestamp_seconds(timestamp)
+        bins = self._bins(values)
+        for window in self.windows.values():
+            window.update(seconds, values, bins)
+        self.last_timestamp = timestamp
+
+    def snapshot(self, now=None):
+        """
+        Current statistics of every window
+        Returns a dict of window label -> DataFrame (one row per KPI)
+        """
+        now = None if now is None else _timestamp_seconds(now)
+        return {
+            label: pd.DataFrame(window.statistics(self.quantiles, now), index=self.kpis)
+            for label, window in self.windows.items()
+        }
+
+    def memory_bytes(self):
+        """Fixed memory held by the window buffers"""
+        return sum(
+            window.count.nbytes + window.mean.nbytes + window.m2.nbytes + window.min.nbytes
+            + window.max.nbytes + window.histogram.nbytes + window.bucket_ids.nbytes
+            for window in self.windows.values()
+        )
+
+class UnitAggregators:
+    """Rolling KPI aggregators for many units, created on first reading"""
+
+    def __init__(self, **options):
+        self.options = options
+        self.units = {}
+
+    def get(self, unit):
+        if unit not in self.units:
+            self.units[unit] = RollingKPIAggregator(**self.options)
+        return self.units[unit]
+
+    def update(self, unit, reading):
+        self.get(unit).update(reading)
+
+    def snapshot(self, unit, now=None):
+        return self.get(unit).snapshot(now)
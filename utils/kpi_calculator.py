@@ -1,3 +1,14 @@
+import numpy as np
+import pandas as pd
+
+# Constants shared by the KPI formulas
+KPI_CONSTANTS = {
+    'energy_price': 0.15,   # €/kWh
+    'mtbf_window': 720,     # hours (30 days)
+    'hours_per_day': 24,
+    'reading_minutes': 60   # minutes covered by one reading (hourly history)
+}
+
 def calculate_energy_efficiency(data):
     """Calculate energy efficiency KPIs"""
     return {
@@ -9,7 +20,7 @@ def calculate_production_performance(data):
     """Calculate production performance KPIs"""
     return {
         'rendement_matiere': (data['product_output'] / data['raw_material_input']) * 100,
-        'productivite': data['product_output'] / 24  # Daily production rate
+        'productivite': data['product_output'] / KPI_CONSTANTS['hours_per_day']  # Daily production rate
     }
 
 def calculate_quality_metrics(data):
@@ -22,7 +33,7 @@ def calculate_quality_metrics(data):
 def calculate_maintenance_metrics(data):
     """Calculate maintenance-related KPIs"""
     return {
-        'mtbf': 720 / max(1, data['maintenance_hours']),  # Assumed 30 days (720 hours)
+        'mtbf': KPI_CONSTANTS['mtbf_window'] / max(1, data['maintenance_hours']),  # Assumed 30 days (720 hours)
         'mttr': data['maintenance_hours']
     }
 
@@ -37,7 +48,7 @@ def calculate_cost_metrics(data):
     """Calculate cost-related KPIs"""
     return {
         'cout_unitaire': data['production_cost'] / data['product_output'],
-        'cout_energetique': (data['energy_consumption'] * 0.15) / data['product_output']  # Assumed energy cost 0.15€/kWh
+        'cout_energetique': (data['energy_consumption'] * KPI_CONSTANTS['energy_price']) / data['product_output']  # Assumed energy cost 0.15€/kWh
     }
 
 def calculate_all_kpis(data):
@@ -50,3 +61,155 @@ def calculate_all_kpis(data):
         'environnement': calculate_environmental_metrics(data),
         'couts': calculate_cost_metrics(data)
     }
+
+# Registry of KPIs and intermediate terms.
+# Each entry declares its inputs (sensor channels, terms or other KPIs), the constants
+# it uses and a formula receiving both as keyword arguments. Terms are not reported.
+KPI_REGISTRY = {}
+KPI_TERMS = {}
+
+def register_kpi(name, inputs, formula, category=None, label=None, constants=()):
+    """Register a KPI computed from sensor channels, terms or other KPIs"""
+    KPI_REGISTRY[name] = {
+        'inputs': tuple(inputs),
+        'constants': tuple(constants),
+        'formula': formula,
+        'category': category,
+        'label': label or name
+    }
+
+def register_term(name, inputs, formula, constants=()):
+    """Register an intermediate term shared between KPI formulas"""
+    KPI_TERMS[name] = {
+        'inputs': tuple(inputs),
+        'constants': tuple(constants),
+        'formula': formula
+    }
+
+# Formulas are written exactly like the scalar calculate_* functions (same
+# operations in the same order), so that both give the same numbers
+register_kpi('efficacite_energetique', ['product_output', 'energy_consumption'],
+             lambda product_output, energy_consumption: (product_output / energy_consumption) * 100,
+             'performance_energetique', "Efficacité énergétique")
+register_kpi('consommation_unitaire', ['energy_consumption', 'product_output'],
+             lambda energy_consumption, product_output: energy_consumption / product_output,
+             'performance_energetique', "Consommation par unité")
+register_kpi('rendement_matiere', ['product_output', 'raw_material_input'],
+             lambda product_output, raw_material_input: (product_output / raw_material_input) * 100,
+             'rendement_production', "Rendement matière")
+register_kpi('productivite', ['product_output'],
+             lambda product_output, hours_per_day: product_output / hours_per_day,
+             'rendement_production', "Productivité", constants=['hours_per_day'])
+register_kpi('temps_cycle', ['product_output'],
+             lambda product_output, reading_minutes: reading_minutes * 1000 / product_output,  # min/t
+             'rendement_production', "Temps de cycle", constants=['reading_minutes'])
+register_kpi('taux_conformite', ['product_quality'],
+             lambda product_quality: product_quality * 100,
+             'qualite_production', "Taux de conformité")
+register_kpi('taux_dechets', ['waste_generated', 'raw_material_input'],
+             lambda waste_generated, raw_material_input: (waste_generated / raw_material_input) * 100,
+             'qualite_production', "Taux de déchets")
+register_kpi('mtbf', ['maintenance_hours'],
+             lambda maintenance_hours, mtbf_window: mtbf_window / np.maximum(1, maintenance_hours),
+             'maintenance', "MTBF", constants=['mtbf_window'])
+register_kpi('mttr', ['maintenance_hours'],
+             lambda maintenance_hours: maintenance_hours,
+             'maintenance', "MTTR")
+register_kpi('emissions_co2', ['co2_emissions', 'product_output'],
+             lambda co2_emissions, product_output: co2_emissions / product_output,
+             'environnement', "Émissions CO2")
+register_kpi('consommation_eau', ['water_consumption', 'product_output'],
+             lambda water_consumption, product_output: water_consumption / product_output,
+             'environnement', "Consommation d'eau")
+register_kpi('cout_unitaire', ['production_cost', 'product_output'],
+             lambda production_cost, product_output: production_cost / product_output,
+             'couts', "Coût unitaire")
+register_kpi('cout_energetique', ['energy_consumption', 'product_output'],
+             lambda energy_consumption, product_output, energy_price: (energy_consumption * energy_price) / product_output,
+             'couts', "Coût énergétique", constants=['energy_price'])
+
+# KPI columns produced by calculate_kpi_frame, grouped like calculate_all_kpis
+KPI_CATEGORIES = {}
+for _name, _definition in KPI_REGISTRY.items():
+    KPI_CATEGORIES.setdefault(_definition['category'], []).append(_name)
+
+def kpis_from_labels(labels):
+    """Map KPI labels (as shown in the analysis page) to registered KPI names, see unsupported_labels"""
+    by_label = {definition['label']: name for name, definition in KPI_REGISTRY.items()}
+    return [by_label[label] for label in labels if label in by_label]
+
+def unsupported_labels(labels):
+    """KPI labels without a registered KPI"""
+    known = {definition['label'] for definition in KPI_REGISTRY.values()}
+    return [label for label in labels if label not in known]
+
+def compile_kpi_plan(kpis=None):
+    """
+    Compile the requested KPIs into an evaluation plan
+    kpis: list of KPI names, all registered KPIs when None
+    Returns a dict with the ordered steps, the sensor columns read and the KPIs reported.
+    Every term or KPI needed by several formulas is evaluated once.
+    """
+    kpis = list(KPI_REGISTRY) if kpis is None else list(kpis)
+    steps = []
+    columns = []
+    visited = set()
+    visiting = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        definition = KPI_REGISTRY.get(name) or KPI_TERMS.get(name)
+        if definition is None:
+            # Anything not registered is read from the data
+            visited.add(name)
+            columns.append(name)
+            return
+        if name in visiting:
+            raise ValueError(f"Cyclic KPI dependency on '{name}'")
+        visiting.add(name)
+        for dependency in definition['inputs']:
+            visit(dependency)
+        visiting.discard(name)
+        visited.add(name)
+        steps.append((name, definition))
+
+    for name in kpis:
+        if name not in KPI_REGISTRY:
+            raise KeyError(f"Unknown KPI '{name}'")
+        visit(name)
+
+    return {'steps': steps, 'columns': columns, 'kpis': kpis}
+
+def evaluate_kpi_plan(plan, data, constants=None):
+    """
+    Evaluate a compiled plan on scalars or arrays
+    data: dict-like of sensor channels (dict, Series, DataFrame or dict of arrays)
+    constants: optional overrides of KPI_CONSTANTS
+    Returns a dict mapping each requested KPI to its value(s)
+    """
+    constants = {**KPI_CONSTANTS, **(constants or {})}
+    values = {
+        # [()] turns 0-d arrays back into scalars so single readings stay scalar
+        name: np.asarray(data[name], dtype=np.float64)[()]
+        for name in plan['columns']
+    }
+    for name, definition in plan['steps']:
+        arguments = {dependency: values[dependency] for dependency in definition['inputs']}
+        arguments.update({constant: constants[constant] for constant in definition['constants']})
+        values[name] = definition['formula'](**arguments)
+    return {name: values[name] for name in plan['kpis']}
+
+def calculate_kpis(data, kpis=None, constants=None):
+    """Calculate a selection of KPIs (all when None) as a flat dict"""
+    return evaluate_kpi_plan(compile_kpi_plan(kpis), data, constants)
+
+def calculate_kpi_frame(data, kpis=None, constants=None):
+    """
+    Calculate KPIs over a whole table of readings
+    data: DataFrame or dict of NumPy arrays with the sensor channels
+    kpis: list of KPI names to compute, all registered KPIs when None
+    Returns a flat DataFrame with one column per KPI (index kept from a DataFrame input)
+    """
+    index = data.index if isinstance(data, pd.DataFrame) else None
+    return pd.DataFrame(calculate_kpis(data, kpis, constants), index=index)
@@ -0,0 +1,196 @@
+import os
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from utils.simulation import DEFAULT_PARAMETERS, PROCESS_KPIS, ProcessSimulator, process_kpis
+
+# Parameters sampled by the sweep, in the order of ProcessSimulator.simulate_batch
+SWEEP_PARAMETERS = ('temperature', 'heat_input', 'inlet_temperature', 'flow_rate')
+
+def sample_parameters(distributions, n, rng):
+    """
+    Draw n scenarios
+    distributions: dict of parameter -> constant, ('normal', mean, std),
+        ('uniform', low, high) or ('lognormal', mean, sigma)
+    """
+    samples = {}
+    for name in SWEEP_PARAMETERS:
+        spec = distributions.get(name, DEFAULT_PARAMETERS[name])
+        if np.isscalar(spec):
+            samples[name] = np.full(n, float(spec))
+        elif spec[0] == 'normal':
+            samples[name] = rng.normal(spec[1], spec[2], n)
+        elif spec[0] == 'uniform':
+            samples[name] = rng.uniform(spec[1], spec[2], n)
+        elif spec[0] == 'lognormal':
+            samples[name] = rng.lognormal(spec[1], spec[2], n)
+        else:
+            raise ValueError(f"Unknown distribution '{spec[0]}' for {name}")
+    return samples
+
+def relative_uncertainty(parameters, relative_std):
+    """Normal distributions centered on the given parameters with a relative standard deviation"""
+    return {
+        name: ('normal', value, abs(value) * relative_std)
+        for name, value in parameters.items() if name in SWEEP_PARAMETERS
+    }
+
+def _simulate_chunk(distributions, n, seed, duration, dt, edges):
+    """
+    Worker: simulate one chunk and reduce it to histograms
+    Returns (count, histograms, minima, maxima) for every output, each histogram
+    being (n_points, n_bins) counts over the shared bin edges of that output.
+    """
+    rng = np.random.default_rng(seed)
+    samples = sample_parameters(distributions, n, rng)
+    results = ProcessSimulator().simulate_batch(**samples, duration=duration, dt=dt)
+    outputs = _outputs(results)
+
+    reduced = {}
+    for name, values in outputs.items():
+        bins = edges[name]
+        n_bins = len(bins) - 1
+        # Bin index of every value, clipped into the edge bins
+        index = np.clip(np.searchsorted(bins, values, side='right') - 1, 0, n_bins - 1)
+        offsets = np.arange(values.shape[1]) * n_bins
+        histogram = np.bincount((index + offsets).ravel(), minlength=values.shape[1] * n_bins)
+        reduced[name] = (histogram.reshape(values.shape[1], n_bins), values.min(axis=0), values.max(axis=0))
+    return n, reduced
+
+def _outputs(results):
+    """Outputs reduced by the sweep (the PROCESS_KPIS among them), each as a (scenarios x points) array"""
+    outputs = {
+        'temperature': results['temperature'],
+        'energy_consumption': results['energy_consumption'][:, None],
+        'product_output': results['product_output'][:, None]
+    }
+    kpis = process_kpis(results['temperature'], results['energy_consumption'], results['product_output'],
+                        results['setpoint'], results['time'])
+    for name in PROCESS_KPIS:
+        outputs[name] = kpis[name][:, None]
+    return outputs
+
+class MonteCarloRunner:
+    """
+    Monte Carlo sweep of ProcessSimulator over sampled parameters
+    Scenarios are simulated in chunks spread over a process pool; every chunk
+    is reduced to histograms in the worker, so memory does not grow with the
+    number of scenarios. run() yields merged quantiles as chunks finish.
+
+    distributions: see sample_parameters
+    n_scenarios, chunk_size: total scenarios and scenarios per task
+    quantiles: quantiles of every output reported by the sweep
+    n_bins: histogram resolution (quantiles are interpolated inside a bin)
+    max_workers: processes (all cores when None)
+    """
+
+    def __init__(self, distributions, n_scenarios=10000, chunk_size=2000, duration=3600, dt=60,
+                 quantiles=(0.05, 0.5, 0.95), n_bins=512, max_workers=None, seed=None):
+        self.distributions = distributions
+        self.n_scenarios = n_scenarios
+        self.chunk_size = chunk_size
+        self.duration = duration
+        self.dt = dt
+        self.quantiles = tuple(quantiles)
+        self.n_bins = n_bins
+        self.max_workers = max_workers or os.cpu_count()
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop the sweep: pending chunks are dropped, running ones are ignored"""
+        self.cancelled.set()
+
+    def _edges(self):
+        """Shared bin edges of every output, from a small pilot run padded by 25%"""
+        pilot_size = min(self.n_scenarios, 1000)
+        rng = np.random.default_rng(self.seed_sequence.spawn(1)[0])
+        samples = sample_parameters(self.distributions, pilot_size, rng)
+        results = ProcessSimulator().simulate_batch(**samples, duration=self.duration, dt=self.dt)
+        edges = {}
+        for name, values in _outputs(results).items():
+            low, high = values.min(), values.max()
+            margin = max(0.25 * (high - low), 1e-6 * max(1.0, abs(high)))
+            edges[name] = np.linspace(low - margin, high + margin, self.n_bins + 1)
+        return edges
+
+    def _quantiles(self, edges, histograms, minima, maxima):
+        """Quantile trajectories from cumulative histograms, interpolated inside the bins"""
+        quantiles = {}
+        for name, histogram in histograms.items():
+            bins = edges[name]
+            cumulative = histogram.cumsum(axis=1)
+            total = cumulative[:, -1:]
+            rows = np.arange(len(histogram))
+            result = {}
+            for q in self.quantiles:
+                target = q * total
+                index = np.minimum((cumulative < target).sum(axis=1), self.n_bins - 1)
+                before = np.where(index > 0, cumulative[rows, index - 1], 0)
+                inside = histogram[rows, index]
+                fraction = np.where(inside > 0, (target[:, 0] - before) / np.maximum(inside, 1), 0.5)
+                value = bins[index] + fraction * (bins[index + 1] - bins[index])
+                result[q] = np.clip(value, minima[name], maxima[name])
+            quantiles[name] = result
+        return quantiles
+
+    def run(self):
+        """
+        Run the sweep, yielding a progress dict after every finished chunk:
+        completed, total, cancelled, time (grid) and quantiles
+        (output -> quantile -> array, scalar outputs having one point)
+        """
+        self.cancelled.clear()
+        edges = self._edges()
+        time = np.linspace(0, self.duration, int(self.duration/self.dt))
+        sizes = [min(self.chunk_size, self.n_scenarios - start)
+                 for start in range(0, self.n_scenarios, self.chunk_size)]
+        seeds = self.seed_sequence.spawn(len(sizes))
+
+        histograms = {}
+        minima = {}
+        maxima = {}
+        completed = 0
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            pending = {
+                executor.submit(_simulate_chunk, self.distributions, size, seed, self.duration, self.dt, edges)
+                for size, seed in zip(sizes, seeds)
+            }
+            while pending and not self.cancelled.is_set():
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count, reduced = future.result()
+                    completed += count
+                    for name, (histogram, low, high) in reduced.items():
+                        if name in histograms:
+                            histograms[name] += histogram
+                            minima[name] = np.minimum(minima[name], low)
+                            maxima[name] = np.maximum(maxima[name], high)
+                        else:
+                            histograms[name], minima[name], maxima[name] = histogram, low, high
+                if done:
+                    yield {
+                        'completed': completed,
+                        'total': self.n_scenarios,
+                        'cancelled': False,
+                        'time': time,
+                        'quantiles': self._quantiles(edges, histograms, minima, maxima)
+                    }
+            if self.cancelled.is_set():
+                yield {
+                    'completed': completed,
+                    'total': self.n_scenarios,
+                    'cancelled': True,
+                    'time': time,
+                    'quantiles': self._quantiles(edges, histograms, minima, maxima) if histograms else {}
+                }
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def result(self):
+        """Run the sweep to completion and return the final progress dict"""
+        last = None
+        for last in self.run():
+            pass
+        return last
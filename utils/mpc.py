@@ -0,0 +1,320 @@
+"""
+Receding-horizon model predictive control of heat input and flow rate
+
+Benchmark (from the repository root): python -m utils.mpc
+"""
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from utils.simulation import ProcessSimulator
+
+# Ranges of the manipulated inputs (kW, m³/h)
+MPC_BOUNDS = {'heat_input': (0.0, 2000.0), 'flow_rate': (18.0, 180.0)}
+
+# Manipulated inputs, in the order of the decision vector
+MANIPULATED_INPUTS = ('heat_input', 'flow_rate')
+
+class ModelPredictiveController:
+    """
+    Receding-horizon temperature control with heat_input and flow_rate
+    Every control period the energy balance is discretized exactly (inputs
+    held over each period) along the shifted plan of the previous period and
+    linearized in the flow rate, the only input multiplying the temperature.
+    Eliminating the predicted temperatures gives a condensed QP in the
+    2 * horizon scaled inputs, with box constraints only:
+
+        min  w_T |T - reference|² + w_Q |ΔQ|² + w_F |ΔF|² + w_r |F - flow_reference|²
+
+    solved by accelerated projected gradient (FISTA), with a step size from a
+    cheap bound of the largest eigenvalue of the Hessian. Every iterate
+    satisfies the input bounds, so when the deadline expires the best iterate
+    so far is applied; the deadline covers the whole step, and when it expires
+    before the solver starts the shifted plan of the previous period is applied.
+
+    simulator: ProcessSimulator whose constants define the model
+    dt: control period (s)
+    horizon: prediction steps
+    bounds: dict of manipulated input -> (low, high) (MPC_BOUNDS by default)
+    temperature_weight: weight of the squared tracking error (°C²)
+    move_weights: dict of manipulated input -> weight of its squared moves
+        (moves scaled by the input range)
+    flow_reference, flow_weight: optional production flow rate the plan is pulled towards
+    deadline: time allowed to each step() (s)
+    max_iterations, tolerance: FISTA stopping rules (tolerance on the scaled step)
+    latency_window: number of steps kept for the latency statistics
+    """
+
+    def __init__(self, simulator=None, dt=60.0, horizon=30, bounds=None, temperature_weight=1.0,
+                 move_weights=None, flow_reference=None, flow_weight=1.0, deadline=0.005, max_iterations=500,
+                 tolerance=1e-6, latency_window=1000):
+        self.simulator = simulator or ProcessSimulator()
+        self.dt = dt
+        self.horizon = horizon
+        self.bounds = {**MPC_BOUNDS, **(bounds or {})}
+        self.low, self.high = np.array([self.bounds[name] for name in MANIPULATED_INPUTS], dtype=np.float64).T
+        self.temperature_weight = temperature_weight
+        self.move_weights = {'heat_input': 10.0, 'flow_rate': 10.0, **(move_weights or {})}
+        self.flow_reference = flow_reference
+        self.flow_weight = flow_weight
+        self.deadline = deadline
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+
+        # Scaled plan (inputs x horizon) and last applied inputs, in [0, 1]
+        self.plan = None
+        self.applied = None
+
+        # Move penalties: first differences, the first one relative to the applied input
+        self.differences = np.eye(horizon) - np.eye(horizon, k=-1)
+        self.lower_triangle = np.tril(np.ones((horizon, horizon), dtype=bool))
+        self.log = deque(maxlen=latency_window)
+
+    def _scale(self, values):
+        return (np.asarray(values, dtype=np.float64) - self.low[:, None]) / (self.high - self.low)[:, None]
+
+    def _unscale(self, scaled):
+        return self.low[:, None] + scaled * (self.high - self.low)[:, None]
+
+    def reset(self, heat_input=None, flow_rate=None):
+        """Forget the plan; the next step starts from the given inputs (mid-range when None)"""
+        inputs = [heat_input, flow_rate]
+        middle = (self.low + self.high) / 2
+        current = np.array([middle[i] if value is None else value for i, value in enumerate(inputs)])
+        self.applied = self._scale(current[:, None])[:, 0]
+        self.plan = np.repeat(self.applied[:, None], self.horizon, axis=1)
+
+    def _prediction(self, temperature, inlet_temperature, plan):
+        """
+        Nominal temperatures along the plan and their sensitivities
+        Returns (T (horizon,), Γ (horizon x 2 horizon)) with T_{k+1} ≈ T[k] + Γ[k] · (z - plan),
+        z being the scaled inputs (all heat inputs, then all flow rates).
+        """
+        sim = self.simulator
+        heat_capacity = sim.volume * sim.rho * sim.cp  # kJ/K
+        Q, F = self._unscale(plan)
+        F = F / 3600  # m³/h -> m³/s
+
+        # dT/dt = -k T + N over every period, inputs held
+        k = (F * sim.rho * sim.cp + sim.heat_loss) / heat_capacity
+        N = (F * sim.rho * sim.cp * inlet_temperature + Q + sim.heat_loss * sim.ambient_temperature) / heat_capacity
+        e = np.exp(-k * self.dt)
+        g = -np.expm1(-k * self.dt) / k
+        dg = (self.dt * e - g) / k
+
+        T = np.empty(self.horizon)
+        previous = np.empty(self.horizon)
+        current = float(temperature)
+        for j in range(self.horizon):
+            previous[j] = current
+            current = current * e[j] + N[j] * g[j]
+            T[j] = current
+
+        # Sensitivities of T_{j+1} to the inputs of period j, per scaled unit
+        dk_dF = sim.rho * sim.cp / heat_capacity / 3600
+        dN_dF = sim.rho * sim.cp * inlet_temperature / heat_capacity / 3600
+        B_Q = g / heat_capacity * (self.high[0] - self.low[0])
+        B_F = ((-self.dt * e * previous + N * dg) * dk_dF + g * dN_dF) * (self.high[1] - self.low[1])
+
+        # Condensed: the input of period j reaches T_{i+1} (i >= j) through e_{j+1} ... e_i
+        log_e = np.cumsum(np.log(e))
+        propagation = np.where(self.lower_triangle, np.exp(np.minimum(log_e[:, None] - log_e[None, :], 0)), 0.0)
+        return T, np.hstack([propagation * B_Q, propagation * B_F])
+
+    def _least_squares(self, T, gamma, reference, plan):
+        """Cost as |A z - b|² over the scaled inputs z (2 horizon,), from _prediction along the plan"""
+        n = self.horizon
+        zeros = np.zeros((n, n))
+        blocks = [np.sqrt(self.temperature_weight) * gamma]
+        targets = [np.sqrt(self.temperature_weight) * (reference - T + gamma @ plan.ravel())]
+        for i, name in enumerate(MANIPULATED_INPUTS):
+            weight = np.sqrt(self.move_weights[name])
+            block = [zeros, zeros]
+            block[i] = weight * self.differences
+            blocks.append(np.hstack(block))
+            target = np.zeros(n)
+            target[0] = weight * self.applied[i]
+            targets.append(target)
+        if self.flow_reference is not None:
+            blocks.append(np.hstack([zeros, np.sqrt(self.flow_weight) * np.eye(n)]))
+            flow_reference = (self.flow_reference - self.low[1]) / (self.high[1] - self.low[1])
+            targets.append(np.full(n, np.sqrt(self.flow_weight) * flow_reference))
+        return np.vstack(blocks), np.concatenate(targets)
+
+    def step(self, temperature, reference, inlet_temperature=25.0):
+        """
+        Compute the inputs of the coming control period
+        temperature: measured temperature (°C)
+        reference: setpoint, scalar or one value per horizon step (°C)
+        inlet_temperature: measured inlet temperature, assumed constant over the horizon
+        Returns a dict: heat_input, flow_rate, predicted (temperatures over the
+        horizon, linearized model; None when the deadline expired before the
+        prediction), iterations, solve_time (s), deadline_hit (step cut short
+        by the deadline).
+        """
+        start = time.perf_counter()
+        if self.plan is None:
+            self.reset()
+        # Warm start: previous plan shifted by one period, last input repeated
+        plan = np.clip(np.hstack([self.plan[:, 1:], self.plan[:, -1:]]), 0, 1)
+        reference = np.broadcast_to(np.asarray(reference, dtype=np.float64), (self.horizon,))
+
+        if time.perf_counter() - start > self.deadline:
+            return self._apply(plan.ravel(), None, 0, start, True)
+        T, gamma = self._prediction(temperature, inlet_temperature, plan)
+        if time.perf_counter() - start > self.deadline:
+            return self._apply(plan.ravel(), T, 0, start, True)
+        A, b = self._least_squares(T, gamma, reference, plan)
+        H = A.T @ A
+        c = A.T @ b
+        # Largest eigenvalue of the (positive semi-definite) Hessian bounded by
+        # its Frobenius norm and its largest absolute row sum (Gershgorin)
+        step_size = 1 / min(np.sqrt(np.sum(H * H)), np.abs(H).sum(axis=1).max())
+
+        # FISTA on ½ zᵀHz - cᵀz; by linearity the gradient at the extrapolated
+        # point reuses H z, one product per iteration
+        z = plan.ravel()
+        Hz = H @ z
+        best, best_cost = z, 0.5 * z @ Hz - c @ z
+        momentum, H_momentum, t = z, Hz, 1.0
+        iterations = 0
+        deadline_hit = False
+        while iterations < self.max_iterations:
+            if time.perf_counter() - start > self.deadline:
+                deadline_hit = True
+                break
+            z_next = np.clip(momentum - step_size * (H_momentum - c), 0, 1)
+            Hz_next = H @ z_next
+            t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+            beta = (t - 1) / t_next
+            momentum = z_next + beta * (z_next - z)
+            H_momentum = Hz_next + beta * (Hz_next - Hz)
+            iterations += 1
+            converged = np.max(np.abs(z_next - z)) < self.tolerance
+            z, Hz, t = z_next, Hz_next, t_next
+            current_cost = 0.5 * z @ Hz - c @ z
+            if current_cost < best_cost:
+                best, best_cost = z, current_cost
+            if converged:
+                break
+
+        return self._apply(best, T + gamma @ (best - plan.ravel()), iterations, start, deadline_hit)
+
+    def _apply(self, plan, predicted, iterations, start, deadline_hit):
+        """Keep the scaled plan (2 horizon,), apply its first inputs and log the step"""
+        self.plan = plan.reshape(len(MANIPULATED_INPUTS), self.horizon)
+        self.applied = self.plan[:, 0].copy()
+        heat_input, flow_rate = self._unscale(self.plan[:, :1])[:, 0]
+        solve_time = time.perf_counter() - start
+        self.log.append((solve_time, iterations, deadline_hit))
+        return {
+            'heat_input': float(heat_input),
+            'flow_rate': float(flow_rate),
+            'predicted': predicted,
+            'iterations': iterations,
+            'solve_time': solve_time,
+            'deadline_hit': deadline_hit
+        }
+
+    def latency(self):
+        """Solve time statistics over the last steps (milliseconds)"""
+        if not self.log:
+            return {'steps': 0, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0, 'mean_iterations': 0.0,
+                    'deadline_hits': 0}
+        solve_times, iterations, deadline_hits = (np.array(values) for values in zip(*self.log))
+        solve_times = solve_times * 1000
+        return {
+            'steps': len(solve_times),
+            'mean_ms': float(solve_times.mean()),
+            'p95_ms': float(np.percentile(solve_times, 95)),
+            'max_ms': float(solve_times.max()),
+            'mean_iterations': float(iterations.mean()),
+            'deadline_hits': int(deadline_hits.sum())
+        }
+
+def run_closed_loop(controller, references, temperature=25.0, inlet_temperatures=25.0, simulator=None):
+    """
+    Control a simulated process over a setpoint schedule
+    references: setpoint of every control period (°C)
+    inlet_temperatures: scalar or one value per period (unmeasured changes are disturbances)
+    simulator: plant (the controller's model by default)
+    Returns a DataFrame, one row per period: time, temperature, reference,
+    heat_input, flow_rate, solve_ms, iterations, deadline_hit.
+    """
+    references = np.asarray(references, dtype=np.float64)
+    inlet_temperatures = np.broadcast_to(np.asarray(inlet_temperatures, dtype=np.float64), references.shape)
+    plant = simulator or controller.simulator
+    if controller.applied is None:
+        controller.reset()
+    heat_input, flow_rate = controller._unscale(controller.applied[:, None])[:, 0]
+    plant.reset(temperature=temperature, heat_input=heat_input, inlet_temperature=inlet_temperatures[0],
+                flow_rate=flow_rate)
+
+    rows = []
+    for i, reference in enumerate(references):
+        # Setpoints known in advance over the horizon, the last one held
+        window = references[i:i + controller.horizon]
+        window = np.pad(window, (0, controller.horizon - len(window)), mode='edge')
+        measured = float(plant.state['temperature'])
+        move = controller.step(measured, window, inlet_temperatures[i])
+        rows.append({'time': plant.state['time'], 'temperature': measured, 'reference': reference,
+                     'heat_input': move['heat_input'], 'flow_rate': move['flow_rate'],
+                     'solve_ms': move['solve_time'] * 1000, 'iterations': move['iterations'],
+                     'deadline_hit': move['deadline_hit']})
+        plant.step(controller.dt, {'heat_input': move['heat_input'], 'flow_rate': move['flow_rate'],
+                                   'inlet_temperature': inlet_temperatures[i]})
+    return pd.DataFrame(rows)
+
+def benchmark_mpc(n_loops=100, periods=120, deadline=0.005, seed=0):
+    """
+    Solve times of n_loops controllers run one after the other on one core
+    Every loop tracks its own setpoint steps and sees an inlet temperature
+    step at three quarters. Returns a dict of solve time statistics (ms), the
+    worst time spent on all loops within one control period, solves stopped by
+    the deadline and
+    the mean absolute tracking error over the second half of each setpoint.
+    """
+    rng = np.random.default_rng(seed)
+    controllers = [ModelPredictiveController(deadline=deadline) for _ in range(n_loops)]
+    plants = [ProcessSimulator() for _ in range(n_loops)]
+    setpoints = rng.uniform(30, 45, (n_loops, 2))
+    references = np.repeat(setpoints, periods // 2, axis=1)
+    inlet = np.where(np.arange(periods) < periods * 3 // 4, 25.0, rng.uniform(20, 30, (n_loops, 1)))
+
+    for controller, plant in zip(controllers, plants):
+        controller.reset()
+        heat_input, flow_rate = controller._unscale(controller.applied[:, None])[:, 0]
+        plant.reset(temperature=25.0, heat_input=heat_input, inlet_temperature=25.0, flow_rate=flow_rate)
+
+    period_times = []
+    errors = []
+    for i in range(periods):
+        period_start = time.perf_counter()
+        for loop, (controller, plant) in enumerate(zip(controllers, plants)):
+            window = np.pad(references[loop, i:i + controller.horizon],
+                            (0, max(0, controller.horizon - (periods - i))), mode='edge')
+            measured = float(plant.state['temperature'])
+            move = controller.step(measured, window, inlet[loop, i])
+            plant.step(controller.dt, {'heat_input': move['heat_input'], 'flow_rate': move['flow_rate'],
+                                       'inlet_temperature': inlet[loop, i]})
+            if i % (periods // 2) >= periods // 4:
+                errors.append(abs(measured - references[loop, i]))
+        period_times.append(time.perf_counter() - period_start)
+
+    statistics = [controller.latency() for controller in controllers]
+    solve_times = np.concatenate([[entry[0] for entry in controller.log] for controller in controllers]) * 1000
+    return {
+        'loops': n_loops,
+        'mean_ms': float(solve_times.mean()),
+        'p95_ms': float(np.percentile(solve_times, 95)),
+        'max_ms': float(solve_times.max()),
+        'worst_period_ms': max(period_times) * 1000,
+        'control_period_ms': controllers[0].dt * 1000,
+        'mean_iterations': float(np.mean([entry['mean_iterations'] for entry in statistics])),
+        'deadline_hits': sum(entry['deadline_hits'] for entry in statistics),
+        'mean_tracking_error': float(np.mean(errors))
+    }
+
+if __name__ == "__main__":
+    for name, value in benchmark_mpc().items():
+        print(f"{name}: {value:.4g}")
@@ -1,41 +1,97 @@
+"""
+Weighted multi-objective optimization of the process parameters
+
+Benchmark (from the repository root): python -m utils.optimization
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import numpy as np
+import pandas as pd
 from scipy.optimize import minimize
+from scipy.stats import qmc
+from utils.result_cache import cached
+
+# Version of the optimization model, part of the result cache keys: bump it when results change
+OPTIMIZER_VERSION = 2
+
+# Default bounds of the process parameters (temperature, pressure, flow rate)
+DEFAULT_BOUNDS = [(100, 200),  # Temperature bounds
+                  (1.5, 3.5),   # Pressure bounds
+                  (80, 120)]    # Flow rate bounds
+
+# Quadratic KPI models: peak value, optimum and curvature for (temperature, pressure, flow rate)
+QUALITY_MODEL = {'peak': 100, 'optimum': np.array([150, 2.5, 100]), 'curvature': np.array([0.2, 0.3, 0.1])}
+YIELD_MODEL = {'peak': 95, 'optimum': np.array([160, 2.7, 95]), 'curvature': np.array([0.1, 0.2, 0.1])}
+# Linear energy model coefficients
+ENERGY_COEFFICIENTS = np.array([0.5, 0.3, 0.2])
+
+def process_outcomes(x):
+    """
+    Simulated KPIs of one candidate (3,) or many (N, 3)
+    Returns (product_quality, yield_rate, energy_consumption), scalars or arrays (N,).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    energy_consumption = x @ ENERGY_COEFFICIENTS
+    product_quality = QUALITY_MODEL['peak'] - ((x - QUALITY_MODEL['optimum'])**2) @ QUALITY_MODEL['curvature']
+    yield_rate = YIELD_MODEL['peak'] - ((x - YIELD_MODEL['optimum'])**2) @ YIELD_MODEL['curvature']
+    return product_quality, yield_rate, energy_consumption
 
 def objective_function(x, weights):
     """
     Multi-objective function combining different KPIs
-    x: array of process parameters
+    x: array of process parameters, one candidate (3,) or many (N, 3)
     weights: importance weights for different objectives
+    Returns a scalar, or an array (N,) for N candidates.
     """
-    temperature, pressure, flow_rate = x
-    
-    # Simulate process outcomes
-    energy_consumption = 0.5 * temperature + 0.3 * pressure + 0.2 * flow_rate
-    product_quality = -0.2 * (temperature - 150)**2 - 0.3 * (pressure - 2.5)**2 - 0.1 * (flow_rate - 100)**2 + 100
-    yield_rate = -0.1 * (temperature - 160)**2 - 0.2 * (pressure - 2.7)**2 - 0.1 * (flow_rate - 95)**2 + 95
-    
+    product_quality, yield_rate, energy_consumption = process_outcomes(x)
+
     # Combine objectives (negative because we want to maximize)
-    return -(weights[0] * product_quality + 
-            weights[1] * yield_rate - 
+    return -(weights[0] * product_quality +
+            weights[1] * yield_rate -
             weights[2] * energy_consumption)
 
-def optimize_parameters(initial_guess, weights, bounds=None):
-    """
-    Optimize process parameters using multi-objective optimization
-    """
-    if bounds is None:
-        bounds = [(100, 200),  # Temperature bounds
-                 (1.5, 3.5),   # Pressure bounds
-                 (80, 120)]    # Flow rate bounds
-    
-    result = minimize(
+def objective_gradient(x, weights):
+    """Exact gradient of objective_function, (3,) or (N, 3)"""
+    x = np.asarray(x, dtype=np.float64)
+    return (2 * weights[0] * QUALITY_MODEL['curvature'] * (x - QUALITY_MODEL['optimum'])
+            + 2 * weights[1] * YIELD_MODEL['curvature'] * (x - YIELD_MODEL['optimum'])
+            + weights[2] * ENERGY_COEFFICIENTS)
+
+def objective_hessian(x, weights):
+    """Exact Hessian of objective_function (constant and diagonal: the objective is a separable quadratic)"""
+    return np.diag(2 * weights[0] * QUALITY_MODEL['curvature'] + 2 * weights[1] * YIELD_MODEL['curvature'])
+
+def _minimize(initial_guess, weights, bounds, method='SLSQP', gradient=True):
+    """Run scipy.optimize.minimize on objective_function"""
+    options = {}
+    if gradient:
+        options['jac'] = objective_gradient
+        if method == 'trust-constr':
+            options['hess'] = objective_hessian
+    return minimize(
         objective_function,
         initial_guess,
         args=(weights,),
         bounds=bounds,
-        method='SLSQP'
+        method=method,
+        **options
     )
-    
+
+# A single local solve is cheaper than a cache lookup: cached on request only (use_cache=True)
+@cached('optimize_parameters', OPTIMIZER_VERSION, enabled=False)
+def optimize_parameters(initial_guess, weights, bounds=None, method='SLSQP', n_starts=1):
+    """
+    Optimize process parameters using multi-objective optimization
+    method: 'SLSQP' (exact gradient) or 'trust-constr' (exact gradient and Hessian)
+    n_starts: above 1, global search from that many starts (see multistart_optimize)
+    """
+    if bounds is None:
+        bounds = DEFAULT_BOUNDS
+    if n_starts > 1:
+        return multistart_optimize(weights, bounds, n_starts, method=method, initial_guess=initial_guess)
+
+    result = _minimize(initial_guess, weights, bounds, method)
+
     return {
         'success': result.success,
         'optimal_parameters': {
@@ -43,5 +99,251 @@ def optimize_parameters(initial_guess, weights, bounds=None):
             'pressure': result.x[1],
             'flow_rate': result.x[2]
         },
-        'optimal_value': -result.fun  # Negative because we minimized negative objective
+        'optimal_value': -result.fun,  # Negative because we minimized negative objective
+        'evaluations': result.nfev
     }
+
+def sobol_starts(bounds, n_starts, seed=0):
+    """n_starts points of a scrambled Sobol sequence scaled to the bounds"""
+    low, high = np.array(bounds, dtype=np.float64).T
+    sampler = qmc.Sobol(d=len(bounds), scramble=True, seed=seed)
+    points = sampler.random_base2(int(np.ceil(np.log2(max(n_starts, 2)))))[:n_starts]
+    return qmc.scale(points, low, high)
+
+def _local_search(x0, weights, bounds, method):
+    """One start of the multi-start search: (x, value, success, evaluations)"""
+    result = _minimize(x0, weights, bounds, method)
+    return result.x, -result.fun, bool(result.success), int(result.nfev)
+
+def multistart_optimize(weights, bounds=None, n_starts=32, method='SLSQP', initial_guess=None, pool='thread',
+                        max_workers=None, value_tolerance=1e-6, distance_tolerance=1e-3, confirmations=3,
+                        target=None, seed=0):
+    """
+    Global search: local optimizations from Sobol starts run on a pool
+    Optima closer than distance_tolerance (relative to the bounds) are merged.
+    The search stops early, cancelling the starts not yet running, once the best
+    value has been reached by `confirmations` starts (within value_tolerance) or
+    once target is reached.
+    initial_guess: optional extra start, run first
+    pool: 'thread' or 'process' (for objectives that hold the GIL)
+    Returns the optimize_parameters dict with 'optima' (distinct optima, best
+    first, with the number of starts reaching each) and 'statistics'.
+    """
+    start = time.perf_counter()
+    bounds = bounds or DEFAULT_BOUNDS
+    low, high = np.array(bounds, dtype=np.float64).T
+    starts = sobol_starts(bounds, n_starts, seed)
+    if initial_guess is not None:
+        starts = np.vstack([np.asarray(initial_guess, dtype=np.float64), starts[:-1]])
+
+    optima = []
+    evaluations = 0
+    completed = 0
+    failures = 0
+    stopped_early = False
+    executor_class = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+    executor = executor_class(max_workers=max_workers)
+    try:
+        futures = [executor.submit(_local_search, x0, weights, bounds, method) for x0 in starts]
+        for future in as_completed(futures):
+            x, value, success, nfev = future.result()
+            completed += 1
+            evaluations += nfev
+            if not success:
+                failures += 1
+                continue
+
+            # Merge with a known optimum or record a new one
+            scaled = (x - low) / (high - low)
+            for optimum in optima:
+                if np.max(np.abs(optimum['scaled'] - scaled)) < distance_tolerance:
+                    optimum['count'] += 1
+                    if value > optimum['value']:
+                        optimum.update(x=x, value=value, scaled=scaled)
+                    break
+            else:
+                optima.append({'x': x, 'value': value, 'scaled': scaled, 'count': 1})
+
+            best = max(optimum['value'] for optimum in optima)
+            hits = sum(optimum['count'] for optimum in optima if optimum['value'] >= best - value_tolerance)
+            if hits >= confirmations or (target is not None and best >= target - value_tolerance):
+                stopped_early = completed < len(futures)
+                break
+    finally:
+        # Starts not yet running are dropped, running ones are not waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    optima.sort(key=lambda optimum: -optimum['value'])
+    values = np.array([optimum['value'] for optimum in optima])
+    statistics = {
+        'starts': len(starts),
+        'completed': completed,
+        'skipped': len(starts) - completed,
+        'failures': failures,
+        'distinct_optima': len(optima),
+        'evaluations': evaluations,
+        'stopped_early': stopped_early,
+        'elapsed': time.perf_counter() - start
+    }
+    if not optima:
+        return {'success': False, 'optimal_parameters': None, 'optimal_value': None, 'evaluations': evaluations,
+                'optima': [], 'statistics': statistics}
+
+    statistics.update(best_value=float(values[0]), worst_value=float(values[-1]), median_value=float(np.median(values)))
+    x = optima[0]['x']
+    return {
+        'success': True,
+        'optimal_parameters': {
+            'temperature': x[0],
+            'pressure': x[1],
+            'flow_rate': x[2]
+        },
+        'optimal_value': optima[0]['value'],
+        'evaluations': evaluations,
+        'optima': [{'parameters': optimum['x'], 'value': optimum['value'], 'count': optimum['count']}
+                   for optimum in optima],
+        'statistics': statistics
+    }
+
+def non_dominated_sort(F):
+    """
+    Fast non-dominated sorting of objective vectors (all minimized)
+    F: array (N, M)
+    Returns the front rank of every row (0 for the non-dominated set). The
+    dominance relation is one (N, N) boolean array; fronts are peeled off by
+    decrementing the domination counts.
+    """
+    no_worse = np.ones((len(F), len(F)), dtype=bool)
+    better = np.zeros((len(F), len(F)), dtype=bool)
+    for column in F.T:
+        no_worse &= column[:, None] <= column[None, :]
+        better |= column[:, None] < column[None, :]
+    # dominates[i, j]: row i dominates row j
+    dominates = no_worse & better
+    counts = np.count_nonzero(dominates, axis=0)
+    ranks = np.full(len(F), -1)
+    current = counts == 0
+    rank = 0
+    while current.any():
+        ranks[current] = rank
+        counts = counts - np.count_nonzero(dominates[current], axis=0)
+        counts[ranks >= 0] = -1
+        current = counts == 0
+        rank += 1
+    return ranks
+
+def crowding_distance(F, ranks):
+    """Crowding distance of every row within its front (infinite at the front boundaries)"""
+    distance = np.zeros(len(F))
+    for m in range(F.shape[1]):
+        order = np.lexsort((F[:, m], ranks))
+        values = F[order, m]
+        sorted_ranks = ranks[order]
+        # Group boundaries: first and last member of every front
+        first = np.r_[True, sorted_ranks[1:] != sorted_ranks[:-1]]
+        last = np.r_[sorted_ranks[1:] != sorted_ranks[:-1], True]
+        group = np.cumsum(first) - 1
+        span = values[last] - values[first]
+        span = np.where(span > 0, span, 1.0)[group]
+        gap = np.zeros(len(F))
+        interior = ~(first | last)
+        gap[interior] = (values[2:] - values[:-2])[interior[1:-1]] / span[interior]
+        gap[first | last] = np.inf
+        distance[order] += gap
+    return distance
+
+def _pareto_objectives(X):
+    """Minimized objectives (N, 3): -quality, -yield, energy"""
+    product_quality, yield_rate, energy_consumption = process_outcomes(X)
+    return np.column_stack([-product_quality, -yield_rate, energy_consumption])
+
+def _variation(parents, low, high, rng, eta_crossover=15, eta_mutation=20):
+    """Simulated binary crossover and polynomial mutation of a (N, 3) parent array"""
+    n, d = parents.shape
+    first, second = parents[:n // 2], parents[n // 2:2 * (n // 2)]
+    u = rng.random(first.shape)
+    beta = np.where(u <= 0.5, (2 * u)**(1 / (eta_crossover + 1)), (1 / (2 * (1 - u)))**(1 / (eta_crossover + 1)))
+    beta = np.where(rng.random(first.shape) < 0.5, beta, 1.0)
+    children = np.concatenate([0.5 * ((1 + beta) * first + (1 - beta) * second),
+                               0.5 * ((1 - beta) * first + (1 + beta) * second)])
+
+    mutate = rng.random(children.shape) < 1 / d
+    u = rng.random(children.shape)
+    delta = np.where(u < 0.5, (2 * u)**(1 / (eta_mutation + 1)) - 1, 1 - (2 * (1 - u))**(1 / (eta_mutation + 1)))
+    children = np.where(mutate, children + delta * (high - low), children)
+    return np.clip(children, low, high)
+
+@cached('pareto_front', OPTIMIZER_VERSION)
+def pareto_front(bounds=None, population=200, generations=100, seed=0):
+    """
+    Trade-off surface between quality, yield and energy (NSGA-II)
+    The population is evaluated as one array every generation; parents and
+    survivors are chosen by front rank and crowding distance.
+    Returns a dict of arrays over the non-dominated set: 'parameters' (K, 3),
+    'product_quality', 'yield_rate' and 'energy_consumption' (K,).
+    """
+    low, high = np.array(bounds or DEFAULT_BOUNDS, dtype=np.float64).T
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(low, high, (population, 3))
+    F = _pareto_objectives(X)
+    ranks = non_dominated_sort(F)
+    distance = crowding_distance(F, ranks)
+
+    for _ in range(generations):
+        # Binary tournament: lower rank first, then larger crowding distance
+        a, b = rng.integers(0, population, (2, population))
+        better = (ranks[a] < ranks[b]) | ((ranks[a] == ranks[b]) & (distance[a] > distance[b]))
+        children = _variation(X[np.where(better, a, b)], low, high, rng)
+
+        X = np.concatenate([X, children])
+        F = np.concatenate([F, _pareto_objectives(children)])
+        ranks = non_dominated_sort(F)
+        distance = crowding_distance(F, ranks)
+        survivors = np.lexsort((-distance, ranks))[:population]
+        X, F, ranks, distance = X[survivors], F[survivors], ranks[survivors], distance[survivors]
+
+    front = ranks == 0
+    return {
+        'parameters': X[front],
+        'product_quality': -F[front, 0],
+        'yield_rate': -F[front, 1],
+        'energy_consumption': F[front, 2]
+    }
+
+def benchmark_optimizer(n_runs=50, seed=0):
+    """
+    Function evaluations and wall time of the optimizer variants
+    Runs every variant (uncached) from the same random starting points and
+    weights. Returns a DataFrame of mean objective and gradient evaluations,
+    mean time (ms) and mean optimal value per variant.
+    """
+    rng = np.random.default_rng(seed)
+    low, high = np.array(DEFAULT_BOUNDS).T
+    starts = rng.uniform(low, high, (n_runs, 3))
+    weights = rng.dirichlet(np.ones(3), n_runs)
+    variants = {
+        'SLSQP (différences finies)': ('SLSQP', False),
+        'SLSQP (gradient exact)': ('SLSQP', True),
+        'trust-constr (gradient et hessienne exacts)': ('trust-constr', True)
+    }
+
+    rows = []
+    for name, (method, gradient) in variants.items():
+        nfev, njev, values = [], [], []
+        start = time.perf_counter()
+        for x0, w in zip(starts, weights):
+            result = _minimize(x0, w, DEFAULT_BOUNDS, method, gradient)
+            nfev.append(result.nfev)
+            njev.append(getattr(result, 'njev', 0))
+            values.append(-result.fun)
+        rows.append({
+            'variante': name,
+            'évaluations objectif': np.mean(nfev),
+            'évaluations gradient': np.mean(njev) if gradient else 0.0,
+            'temps (ms)': (time.perf_counter() - start) / n_runs * 1000,
+            'valeur optimale': np.mean(values)
+        })
+    return pd.DataFrame(rows).set_index('variante')
+
+if __name__ == "__main__":
+    print(benchmark_optimizer().round(3).to_string())
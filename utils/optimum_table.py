@@ -0,0 +1,228 @@
+"""
+Precomputed optima over the weight simplex
+
+Benchmark (from the repository root): python -m utils.optimum_table
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from utils.optimization import DEFAULT_BOUNDS, OPTIMIZER_VERSION, _minimize, objective_function, objective_gradient
+
+def simplex_lattice(resolution):
+    """
+    Lattice points (i, j) of the weight simplex, weights (i, j, resolution - i - j) / resolution
+    Rows are ordered by i, then j, matching lattice_index.
+    """
+    return np.array([(i, j) for i in range(resolution + 1) for j in range(resolution + 1 - i)])
+
+def lattice_index(i, j, resolution):
+    """Row of lattice point (i, j) in simplex_lattice"""
+    return i * (resolution + 1) - i * (i - 1) // 2 + j
+
+class OptimumTable:
+    """
+    Optimal parameters precomputed over a lattice of the weight simplex
+    Every lattice point is solved once with optimize_parameters' local search,
+    warm-started from its neighbour along a serpentine path through the
+    lattice. Queries interpolate the three vertices of the lattice triangle
+    containing the weights (barycentric coordinates).
+
+    A point whose solve fails, from the warm start and again from the middle
+    of the box, is marked invalid: queries whose triangle uses it solve the
+    weights directly instead of interpolating.
+
+    The table records the bounds and the objective model version it was built
+    for. When they change, refresh() keeps the points that still satisfy the
+    optimality conditions and re-solves only the others, from their previous
+    optimum.
+
+    resolution: lattice divisions per side ((resolution + 1)(resolution + 2) / 2 points)
+    path: .npz file the table is kept in (memory only when None)
+    kkt_tolerance: largest projected gradient accepted for a kept point
+    """
+
+    def __init__(self, resolution=40, bounds=None, path=None, kkt_tolerance=1e-3):
+        self.resolution = resolution
+        self.bounds = [tuple(map(float, bound)) for bound in (bounds or DEFAULT_BOUNDS)]
+        self.path = path
+        self.kkt_tolerance = kkt_tolerance
+        self.lattice = simplex_lattice(resolution)
+        self.weights = np.column_stack([self.lattice, resolution - self.lattice.sum(axis=1)]) / resolution
+        self.parameters = None
+        self.values = None
+        self.valid = None
+        self.version = None
+        self.built_bounds = None
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with np.load(self.path) as stored:
+            if int(stored['resolution']) != self.resolution:
+                return
+            self.parameters = stored['parameters']
+            self.values = stored['values']
+            self.valid = stored['valid'] if 'valid' in stored.files else np.ones(len(self.values), dtype=bool)
+            self.version = int(stored['version'])
+            self.built_bounds = [tuple(bound) for bound in stored['bounds'].tolist()]
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, resolution=self.resolution, parameters=self.parameters, values=self.values,
+                     valid=self.valid, version=self.version, bounds=np.array(self.built_bounds))
+        os.replace(temporary, self.path)
+
+    def is_current(self):
+        """True when the table matches the bounds and the objective model version"""
+        return (self.parameters is not None and self.version == OPTIMIZER_VERSION
+                and self.built_bounds == self.bounds)
+
+    def _serpentine(self):
+        """Lattice rows in an order where consecutive points are neighbours"""
+        order = []
+        for i in range(self.resolution + 1):
+            row = [lattice_index(i, j, self.resolution) for j in range(self.resolution + 1 - i)]
+            order.extend(row if i % 2 == 0 else row[::-1])
+        return order
+
+    def _optimal(self, x, weights):
+        """Projected-gradient check of the optimality (KKT) conditions at x under the bounds"""
+        low, high = np.array(self.bounds).T
+        gradient = objective_gradient(x, weights)
+        at_low = x <= low + 1e-9 * (high - low)
+        at_high = x >= high - 1e-9 * (high - low)
+        projected = np.where(at_low, np.minimum(gradient, 0), np.where(at_high, np.maximum(gradient, 0), gradient))
+        return np.max(np.abs(projected) * (high - low)) <= self.kkt_tolerance * max(1.0, abs(objective_function(x, weights)))
+
+    def refresh(self):
+        """
+        Build the table, or update it after a change of bounds or model version
+        Returns the number of lattice points solved.
+        """
+        if self.is_current():
+            return 0
+        low, high = np.array(self.bounds).T
+        middle = (low + high) / 2
+        previous = self.parameters
+        parameters = np.empty((len(self.lattice), 3))
+        values = np.empty(len(self.lattice))
+        valid = np.ones(len(self.lattice), dtype=bool)
+        solved = 0
+        x0 = middle
+        for row in self._serpentine():
+            weights = self.weights[row]
+            if previous is not None:
+                candidate = np.clip(previous[row], low, high)
+                if self._optimal(candidate, weights):
+                    parameters[row] = candidate
+                    values[row] = -objective_function(candidate, weights)
+                    x0 = candidate
+                    continue
+                x0 = candidate
+            result = _minimize(x0, weights, self.bounds)
+            if not result.success:
+                result = _minimize(middle, weights, self.bounds)
+            parameters[row] = result.x
+            values[row] = -result.fun
+            valid[row] = result.success
+            # A failed solve is no warm start for the next point
+            x0 = result.x if result.success else middle
+            solved += 1
+
+        self.parameters, self.values, self.valid = parameters, values, valid
+        self.version, self.built_bounds = OPTIMIZER_VERSION, list(self.bounds)
+        if self.path is not None:
+            self._save()
+        return solved
+
+    def _vertices(self, weights):
+        """Rows and barycentric coordinates of the lattice triangle containing the weights"""
+        total = weights[0] + weights[1] + weights[2]
+        u = weights[0] / total * self.resolution
+        v = weights[1] / total * self.resolution
+        i, j = min(int(u), self.resolution), min(int(v), self.resolution)
+        if i + j >= self.resolution:
+            # On the outer edge: use the triangle just inside it
+            if i > 0:
+                i -= 1
+            else:
+                j -= 1
+        fu, fv = u - i, v - j
+        n = self.resolution
+        if fu + fv <= 1:
+            rows = (lattice_index(i, j, n), lattice_index(i + 1, j, n), lattice_index(i, j + 1, n))
+            coordinates = (1 - fu - fv, fu, fv)
+        else:
+            rows = (lattice_index(i + 1, j + 1, n), lattice_index(i, j + 1, n), lattice_index(i + 1, j, n))
+            coordinates = (fu + fv - 1, 1 - fu, 1 - fv)
+        return rows, coordinates
+
+    def _lookup(self, weights):
+        """
+        Optimal parameters for the weights and whether they come from successful solves
+        Interpolated in the table, or solved directly when the triangle uses an invalid point.
+        """
+        if not self.is_current():
+            self.refresh()
+        rows, coordinates = self._vertices(weights)
+        x = sum(w * self.parameters[row] for row, w in zip(rows, coordinates))
+        if all(self.valid[row] for row, w in zip(rows, coordinates) if w > 0):
+            return x, True
+        result = _minimize(x, weights, self.bounds)
+        return result.x, bool(result.success)
+
+    def query(self, weights):
+        """Interpolated optimal (temperature, pressure, flow_rate) for the weights"""
+        return self._lookup(weights)[0]
+
+    def query_result(self, weights):
+        """Interpolated optimum in the optimize_parameters format"""
+        x, success = self._lookup(weights)
+        return {
+            'success': success,
+            'optimal_parameters': {
+                'temperature': x[0],
+                'pressure': x[1],
+                'flow_rate': x[2]
+            },
+            'optimal_value': -objective_function(x, weights)
+        }
+
+# Process-wide table shared by the pages (persisted only when OPTIMUM_TABLE_PATH is set)
+OPTIMUM_TABLE = OptimumTable(path=os.environ.get('OPTIMUM_TABLE_PATH'))
+
+def benchmark_table(resolution=40, n_queries=500, seed=0):
+    """
+    Build time, query latency and accuracy of an in-memory table
+    Interpolated optima are compared with direct solves at random weights.
+    """
+    rng = np.random.default_rng(seed)
+    table = OptimumTable(resolution=resolution)
+    start = time.perf_counter()
+    solved = table.refresh()
+    build = time.perf_counter() - start
+
+    samples = rng.dirichlet(np.ones(3), n_queries)
+    start = time.perf_counter()
+    for weights in samples:
+        table.query(weights)
+    query = (time.perf_counter() - start) / n_queries
+
+    gaps = [-_minimize(table.query(weights), weights, table.bounds).fun - table.query_result(weights)['optimal_value']
+            for weights in samples]
+    return {
+        'points': len(table.lattice),
+        'solved': solved,
+        'build_s': build,
+        'query_us': query * 1e6,
+        'mean_value_gap': float(np.mean(gaps)),
+        'max_value_gap': float(np.max(gaps))
+    }
+
+if __name__ == "__main__":
+    for name, value in benchmark_table().items():
+        print(f"{name}: {value:.4g}")
@@ -0,0 +1,193 @@
+"""
+Stiff multi-tank reactor model
+
+Benchmark (from the repository root): python -m utils.reactor
+"""
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.integrate import odeint, solve_ivp
+
+class MultiTankReactor:
+    """
+    Tanks in series with an exothermic first-order reaction A -> B
+    Each tank has three states: concentration of A (mol/m³), temperature (K)
+    and pressure (bar). The state vector interleaves them tank by tank,
+    [C0, T0, P0, C1, T1, P1, ...], so the Jacobian is banded.
+
+    The reaction (Arrhenius) and the pressure response (fast relaxation toward
+    a vapor-pressure law) are much faster than the residence time, which makes
+    the system stiff: implicit solvers (BDF, LSODA) with the analytic Jacobian
+    are used.
+    """
+
+    def __init__(self, n_tanks=5):
+        self.n_tanks = n_tanks
+        # Process parameters
+        self.volume = 100.0  # m³ (total, split equally between the tanks)
+        self.cp = 4.18  # kJ/kg.K
+        self.rho = 1000.0  # kg/m³
+        # Reaction
+        self.k0 = 1.0e10  # 1/s
+        self.activation_temperature = 10000.0  # Ea/R, K
+        self.reaction_enthalpy = -50.0  # kJ/mol
+        self.feed_concentration = 1000.0  # mol/m³
+        # Pressure
+        self.reference_pressure = 2.5  # bar at reference_temperature
+        self.reference_temperature = 423.15  # K
+        self.vaporization_temperature = 4000.0  # ΔHvap/R, K
+        self.pressure_time_constant = 1.0  # s
+
+    def _coefficients(self, parameters):
+        """Per-tank constants of the right-hand side"""
+        tank_volume = self.volume / self.n_tanks
+        flow = parameters.get('flow_rate', 100) / 3600  # m³/h -> m³/s
+        return {
+            'dilution': flow / tank_volume,  # 1/s
+            'heating': parameters.get('heat_input', 1000) / self.n_tanks / (tank_volume * self.rho * self.cp),  # K/s
+            'inlet_temperature': parameters.get('inlet_temperature', 25) + 273.15,
+            'feed_concentration': parameters.get('feed_concentration', self.feed_concentration),
+            'reaction_heat': -self.reaction_enthalpy / (self.rho * self.cp)  # K.m³/mol
+        }
+
+    def initial_state(self, parameters):
+        """Uniform initial state: feed-free tanks at the given temperature and pressure"""
+        y0 = np.empty((self.n_tanks, 3))
+        y0[:, 0] = parameters.get('concentration', 0.0)
+        y0[:, 1] = parameters.get('temperature', 150) + 273.15
+        y0[:, 2] = parameters.get('pressure', self.reference_pressure)
+        return y0.ravel()
+
+    def _rates(self, T):
+        """Reaction rate constant, equilibrium pressure and their temperature derivatives"""
+        k = self.k0 * np.exp(-self.activation_temperature / T)
+        dk = k * self.activation_temperature / T**2
+        P_eq = self.reference_pressure * np.exp(
+            self.vaporization_temperature * (1 / self.reference_temperature - 1 / T)
+        )
+        dP_eq = P_eq * self.vaporization_temperature / T**2
+        return k, dk, P_eq, dP_eq
+
+    def rhs(self, t, y, c):
+        """
+        Right-hand side, vectorized: y may be (3n,) or (3n, m) for m states at once
+        """
+        y = np.asarray(y)
+        states = y.reshape(self.n_tanks, 3, -1)
+        C, T, P = states[:, 0], states[:, 1], states[:, 2]
+
+        # Upstream values: feed for the first tank, previous tank otherwise
+        C_up = np.concatenate([np.full((1, C.shape[1]), c['feed_concentration']), C[:-1]])
+        T_up = np.concatenate([np.full((1, T.shape[1]), c['inlet_temperature']), T[:-1]])
+
+        k, _, P_eq, _ = self._rates(T)
+        reaction = k * C
+        derivatives = np.empty_like(states)
+        derivatives[:, 0] = c['dilution'] * (C_up - C) - reaction
+        derivatives[:, 1] = c['dilution'] * (T_up - T) + c['reaction_heat'] * reaction + c['heating']
+        derivatives[:, 2] = (P_eq - P) / self.pressure_time_constant
+        return derivatives.reshape(y.shape)
+
+    def jacobian(self, t, y, c, sparse_format=True):
+        """Analytic Jacobian of rhs (sparse CSC by default, dense otherwise)"""
+        n = self.n_tanks
+        states = np.asarray(y).reshape(n, 3)
+        C, T = states[:, 0], states[:, 1]
+        k, dk, _, dP_eq = self._rates(T)
+        a = c['dilution']
+        h = c['reaction_heat']
+        tau = self.pressure_time_constant
+
+        c_index = 3 * np.arange(n)
+        t_index = c_index + 1
+        p_index = c_index + 2
+        rows = [c_index, c_index, t_index, t_index, p_index, p_index]
+        cols = [c_index, t_index, c_index, t_index, t_index, p_index]
+        values = [-a - k, -dk * C, h * k, -a + h * dk * C, dP_eq / tau, np.full(n, -1 / tau)]
+        # Coupling with the upstream tank
+        rows += [c_index[1:], t_index[1:]]
+        cols += [c_index[:-1], t_index[:-1]]
+        values += [np.full(n - 1, a), np.full(n - 1, a)]
+
+        matrix = sparse.csc_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(3 * n, 3 * n)
+        )
+        return matrix if sparse_format else matrix.toarray()
+
+    def simulate_process(self, parameters, duration=3600, dt=60, method='BDF', jacobian='analytic',
+                         rtol=1e-6, atol=1e-8):
+        """
+        Simulate the tanks
+        method: 'BDF' or 'LSODA' (solve_ivp), or 'odeint' (the ProcessSimulator
+            path, with a finite-difference Jacobian)
+        jacobian: 'analytic' (sparse for BDF, dense for LSODA) or None (finite differences)
+        Returns time, per-tank (tanks x time) concentration, temperature (°C) and
+        pressure arrays, and the energy consumption and product output.
+        """
+        c = self._coefficients(parameters)
+        y0 = self.initial_state(parameters)
+        t = np.linspace(0, duration, int(duration/dt))
+
+        if method == 'odeint':
+            y = odeint(lambda y, t: self.rhs(t, y, c), y0, t, rtol=rtol, atol=atol).T
+            evaluations = None
+        else:
+            options = {}
+            if jacobian == 'analytic':
+                # solve_ivp passes args to the Jacobian as well
+                options['jac'] = (lambda t, y, c: self.jacobian(t, y, c, sparse_format=(method == 'BDF')))
+            elif method == 'BDF':
+                # Finite differences still benefit from the sparsity pattern
+                options['jac_sparsity'] = self.jacobian(0.0, y0, c) != 0
+            solution = solve_ivp(self.rhs, (0, duration), y0, method=method, t_eval=t, args=(c,),
+                                 vectorized=True, rtol=rtol, atol=atol, **options)
+            if not solution.success:
+                raise RuntimeError(f"Échec de l'intégration : {solution.message}")
+            y = solution.y
+            evaluations = solution.nfev
+
+        states = y.reshape(self.n_tanks, 3, -1)
+        return {
+            'time': t,
+            'concentration': states[:, 0],
+            'temperature': states[:, 1] - 273.15,
+            'pressure': states[:, 2],
+            'energy_consumption': parameters.get('heat_input', 1000) * duration / 3600,  # kWh
+            'product_output': parameters.get('flow_rate', 100) * duration / 3600,  # m³
+            'rhs_evaluations': evaluations
+        }
+
+def benchmark_tanks(tank_counts=(1, 5, 10, 25, 50, 100, 200), parameters=None, duration=3600, dt=60,
+                    repeats=3, max_odeint_tanks=200):
+    """
+    Solve time against the number of tanks for each solver path
+    The odeint path (dense finite-difference Jacobian, as in ProcessSimulator)
+    is skipped above max_odeint_tanks. Returns a DataFrame of the best time of
+    `repeats` runs, in milliseconds.
+    """
+    parameters = parameters or {'temperature': 150, 'flow_rate': 100, 'heat_input': 1000}
+    paths = {
+        'odeint': {'method': 'odeint'},
+        'LSODA (Jacobien analytique)': {'method': 'LSODA'},
+        'BDF (Jacobien creux analytique)': {'method': 'BDF'}
+    }
+    rows = []
+    for n_tanks in tank_counts:
+        reactor = MultiTankReactor(n_tanks)
+        row = {'n_tanks': n_tanks, 'n_states': 3 * n_tanks}
+        for name, options in paths.items():
+            if options['method'] == 'odeint' and n_tanks > max_odeint_tanks:
+                row[name] = np.nan
+                continue
+            best = np.inf
+            for _ in range(repeats):
+                start = time.perf_counter()
+                reactor.simulate_process(parameters, duration, dt, **options)
+                best = min(best, time.perf_counter() - start)
+            row[name] = best * 1000
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('n_tanks')
+
+if __name__ == "__main__":
+    print(benchmark_tanks().round(1).to_string())
@@ -0,0 +1,237 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# Significant digits kept when quantizing float inputs into cache keys; 17
+# digits round-trip every float64, so keys are exact unless a caller asks for
+# fewer (and accepts that nearby inputs share a result)
+KEY_DIGITS = 17
+
+def _quantize(value, digits):
+    """Round a float to `digits` significant digits"""
+    if digits >= KEY_DIGITS:
+        return value
+    return float(f"{value:.{digits}g}")
+
+def _quantize_array(values, digits):
+    """Round a float array to `digits` significant digits"""
+    if digits >= KEY_DIGITS:
+        return values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.where(values == 0, 0, np.floor(np.log10(np.abs(values))))
+    scale = 10.0 ** (digits - 1 - np.nan_to_num(magnitude))
+    return np.round(values * scale) / scale
+
+def canonical(value, digits=KEY_DIGITS):
+    """
+    JSON-serializable canonical form of an input
+    Dicts are sorted, tuples become lists and floats are quantized (exact at
+    KEY_DIGITS), so that equal inputs give equal keys. Objects can take part through a cache_key() method.
+    """
+    if isinstance(value, dict):
+        return {str(key): canonical(value[key], digits) for key in sorted(value, key=str)}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item, digits) for item in value]
+    if isinstance(value, (bool, np.bool_)) or value is None or isinstance(value, str):
+        return bool(value) if isinstance(value, np.bool_) else value
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        value = _quantize(float(value), digits)
+        # Integral floats hash like ints, so that 100 and 100.0 share a key
+        return int(value) if value.is_integer() else value
+    if isinstance(value, np.ndarray):
+        if np.issubdtype(value.dtype, np.floating):
+            value = _quantize_array(value.astype(np.float64), digits)
+        return {'ndarray': str(value.dtype), 'shape': list(value.shape),
+                'sha256': hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()}
+    if hasattr(value, 'cache_key'):
+        return {type(value).__name__: canonical(value.cache_key(), digits)}
+    raise TypeError(f"Cannot build a cache key from {type(value).__name__}")
+
+def cache_key(namespace, version, payload, digits=KEY_DIGITS):
+    """SHA-256 of the canonical (namespace, version, payload)"""
+    text = json.dumps([namespace, str(version), canonical(payload, digits)], separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    """
+    Two-tier cache of pickled results, keyed by content hash
+    The memory tier is an LRU bounded by the size of the pickles; the disk tier
+    is an SQLite database shared by every process using the same path, trimmed
+    to max_disk_bytes by last access. The size of the disk tier is kept as a
+    running total, re-read from the database only when it exceeds the limit
+    (other processes may have trimmed it meanwhile).
+
+    max_memory_bytes: size of the memory tier
+    path: SQLite file of the disk tier (no disk tier when None)
+    max_disk_bytes: size of the disk tier
+    """
+
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, path=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.memory_bytes = 0
+        self.connection = None
+        self.connection_pid = None
+        self.disk_bytes = None
+        self.lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'memory_evictions': 0,
+                         'disk_evictions': 0}
+
+    def _database(self):
+        """SQLite connection of the disk tier, opened on first use (and again in forked processes)"""
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection_pid = os.getpid()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                              isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self.disk_bytes = self._disk_total(self.connection)
+        return self.connection
+
+    def _disk_total(self, database):
+        return database.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def _remember(self, key, blob):
+        """Insert into the memory tier and evict least recently used entries"""
+        if key in self.entries:
+            self.memory_bytes -= len(self.entries.pop(key))
+        if len(blob) > self.max_memory_bytes:
+            return
+        self.entries[key] = blob
+        self.memory_bytes += len(blob)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            self.counters['memory_evictions'] += 1
+
+    def get(self, key, default=None):
+        """Cached result for a key, or default"""
+        with self.lock:
+            blob = self.entries.get(key)
+            if blob is not None:
+                self.entries.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return pickle.loads(blob)
+
+            if self.path is not None:
+                database = self._database()
+                row = database.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    database.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._remember(key, row[0])
+                    self.counters['disk_hits'] += 1
+                    return pickle.loads(row[0])
+
+            self.counters['misses'] += 1
+            return default
+
+    def put(self, key, value):
+        """Store a result in both tiers"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._remember(key, blob)
+            if self.path is not None:
+                database = self._database()
+                previous = database.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+                database.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                 (key, sqlite3.Binary(blob), len(blob), time.time()))
+                self.disk_bytes += len(blob) - (previous[0] if previous else 0)
+                if self.disk_bytes > self.max_disk_bytes:
+                    self._trim_disk(database)
+
+    def _trim_disk(self, database):
+        """Delete least recently used rows until the disk tier fits in max_disk_bytes"""
+        total = self._disk_total(database)
+        self.disk_bytes = total
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in database.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            database.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            self.counters['disk_evictions'] += 1
+        self.disk_bytes = total
+
+    def clear(self):
+        """Empty both tiers"""
+        with self.lock:
+            self.entries.clear()
+            self.memory_bytes = 0
+            if self.path is not None:
+                self._database().execute("DELETE FROM results")
+                self.disk_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters, hit rate and size of the memory tier"""
+        with self.lock:
+            stats = dict(self.counters)
+            requests = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+            stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / requests if requests else 0.0
+            stats['memory_entries'] = len(self.entries)
+            stats['memory_bytes'] = self.memory_bytes
+            return stats
+
+# Process-wide cache shared by the pages, in memory only; the disk tier is
+# opt-in, shared by every process (and replica) pointing RESULT_CACHE_PATH at
+# the same file
+RESULT_CACHE = ResultCache(path=os.environ.get('RESULT_CACHE_PATH'))
+
+def cached(namespace, version, cache=None, digits=KEY_DIGITS, enabled=True):
+    """
+    Decorator caching a function by the content of its arguments
+    namespace: name of the cached computation
+    version: model version, to be bumped whenever the results change
+    cache: ResultCache (RESULT_CACHE by default)
+    digits: significant digits of the float arguments in the key
+    enabled: whether calls are cached by default; computations cheaper than a
+        cache lookup leave it False and callers opt in with use_cache=True
+    Defaults are applied before hashing, so f(x) and f(x, dt=60) share an
+    entry. Calls whose arguments cannot be hashed run uncached. The wrapper
+    takes a use_cache keyword overriding `enabled`, and exposes the plain
+    function as `.uncached`.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, use_cache=None, **kwargs):
+            if not (enabled if use_cache is None else use_cache):
+                return function(*args, **kwargs)
+            target = cache or RESULT_CACHE
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            try:
+                key = cache_key(namespace, version, bound.arguments, digits)
+            except TypeError:
+                return function(*args, **kwargs)
+
+            missing = object()
+            result = target.get(key, missing)
+            if result is missing:
+                result = function(*args, **kwargs)
+                target.put(key, result)
+            return result
+
+        wrapper.uncached = function
+        return wrapper
+    return decorator
@@ -1,5 +1,67 @@
 import numpy as np
+from collections import deque
 from scipy.integrate import odeint
+from utils.kpi_calculator import KPI_CONSTANTS
+from utils.result_cache import cached
+
+# Version of the process model, part of the result cache keys: bump it when the
+# model or the result dict changes (2: 'decimated' result key, 3: heat loss to ambient,
+# 4: flow rate in m³/h in the energy balance, 5: KPIs scored against the setpoint)
+SIMULATOR_VERSION = 5
+
+# Defaults of ProcessSimulator.simulate_process
+DEFAULT_PARAMETERS = {'temperature': 150, 'heat_input': 1000, 'inlet_temperature': 25, 'flow_rate': 100}
+
+# KPIs derived from a simulated trajectory (see process_kpis)
+PROCESS_KPIS = ('energy_efficiency', 'product_quality', 'yield_rate', 'cost_per_unit')
+
+# Temperature bands around the setpoint (°C): deviations are scored with a
+# Gaussian of this width for the quality and yield KPIs
+KPI_TEMPERATURE_BANDS = {'product_quality': 10.0, 'yield_rate': 25.0}
+
+def process_kpis(temperature, energy_consumption, product_output, setpoint, time=None):
+    """
+    KPIs of simulated trajectories
+    temperature: array (..., time)
+    energy_consumption, product_output: per-trajectory totals (kWh, m³)
+    setpoint: temperature the quality and yield are scored against, per trajectory (°C)
+    time: sample times (a uniform grid when None); scores are time-weighted
+        averages (trapezoidal rule), so full and decimated trajectories agree
+    Returns a dict of arrays shaped like temperature[..., 0].
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)
+    energy_consumption = np.asarray(energy_consumption, dtype=np.float64)
+    product_output = np.asarray(product_output, dtype=np.float64)
+    deviation = temperature - np.asarray(setpoint, dtype=np.float64)[..., None]
+    if time is None:
+        time = np.arange(temperature.shape[-1], dtype=np.float64)
+    time = np.asarray(time, dtype=np.float64)
+    kpis = {
+        'energy_efficiency': np.minimum(100, product_output / energy_consumption * 100),
+        'cost_per_unit': energy_consumption * KPI_CONSTANTS['energy_price'] / product_output
+    }
+    for name, band in KPI_TEMPERATURE_BANDS.items():
+        score = np.exp(-0.5 * (deviation / band)**2)
+        if len(time) < 2:
+            kpis[name] = 100 * score[..., 0]
+        else:
+            kpis[name] = 100 * np.trapezoid(score, time, axis=-1) / (time[-1] - time[0])
+    return {name: kpis[name] for name in PROCESS_KPIS}
+
+def decimate_trajectory(values, tolerance, reference, last_level=None):
+    """
+    Event-driven decimation of a trajectory
+    A point is kept each time the values cross a multiple of tolerance away
+    from reference, so linear interpolation between the kept points stays
+    within tolerance on monotonic stretches.
+    last_level: level of the previous segment when decimating in segments
+    Returns (boolean mask of the kept points, level of the last point).
+    """
+    level = np.floor((values - reference) / tolerance)
+    previous = np.empty_like(level)
+    previous[1:] = level[:-1]
+    previous[0] = np.nan if last_level is None else last_level
+    return level != previous, level[-1]
 
 class ProcessSimulator:
     def __init__(self):
@@ -7,47 +69,276 @@ class ProcessSimulator:
         self.volume = 100.0  # m³
         self.cp = 4.18  # kJ/kg.K
         self.rho = 1000.0  # kg/m³
+        # Heat losses to the surroundings (see utils.calibration)
+        self.heat_loss = 0.0  # kW/K
+        self.ambient_temperature = 20.0  # °C
+
+        # Real-time stepping state (see reset/step)
+        self.state = None
+        self.history = None
         
     def energy_balance(self, T, t, Q_in, T_in, flow_rate):
-        """Energy balance equation for temperature evolution"""
-        dTdt = (flow_rate * self.rho * self.cp * (T_in - T) + Q_in) / (self.volume * self.rho * self.cp)
+        """Energy balance equation for temperature evolution (flow rate in m³/h)"""
+        flow = flow_rate / 3600  # m³/h -> m³/s
+        dTdt = (flow * self.rho * self.cp * (T_in - T) + Q_in
+                + self.heat_loss * (self.ambient_temperature - T)) / (self.volume * self.rho * self.cp)
         return dTdt
+
+    def analytical_temperature(self, t, T_initial, Q_in, T_in, flow_rate):
+        """
+        Exact solution of energy_balance (linear ODE with constant coefficients)
+        dT/dt = -k (T - T_ss) with k = (F * rho * cp + heat_loss) / (volume * rho * cp)
+        and T_ss = (F * rho * cp * T_in + Q_in + heat_loss * T_ambient)
+        / (F * rho * cp + heat_loss), F = flow_rate / 3600 (m³/s), hence
+        T(t) = T_ss + (T_initial - T_ss) * exp(-k t)
+        Parameters may be arrays broadcasting against t (one scenario per row).
+        """
+        t = np.asarray(t, dtype=np.float64)
+        flow = np.asarray(flow_rate, dtype=np.float64) / 3600  # m³/h -> m³/s
+        conductance = flow * self.rho * self.cp + self.heat_loss  # kW/K
+        k = conductance / (self.volume * self.rho * self.cp)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            T_ss = (flow * self.rho * self.cp * T_in + Q_in + self.heat_loss * self.ambient_temperature) / conductance
+            T = T_ss + (T_initial - T_ss) * np.exp(-k * t)
+        if np.any(k == 0):
+            # No through-flow and no losses: constant heating rate
+            T = np.where(k == 0, T_initial + Q_in / (self.volume * self.rho * self.cp) * t, T)
+        return T
+
+    def cache_key(self):
+        """Model attributes identifying the results of this simulator in the result cache"""
+        return {'volume': self.volume, 'cp': self.cp, 'rho': self.rho, 'heat_loss': self.heat_loss,
+                'ambient_temperature': self.ambient_temperature}
+
+    def has_linear_energy_balance(self):
+        """True unless a subclass replaces energy_balance (e.g. with a non-linear model)"""
+        return type(self).energy_balance is ProcessSimulator.energy_balance
+
+    def compare_solvers(self, parameters, duration=3600, dt=60):
+        """Maximum absolute temperature difference between the analytical and odeint paths"""
+        analytical = self.simulate_process(parameters, duration, dt, solver='analytical')
+        numerical = self.simulate_process(parameters, duration, dt, solver='odeint')
+        return np.max(np.abs(analytical['temperature'] - numerical['temperature']))
     
-    def simulate_process(self, parameters, duration=3600, dt=60):
+    # Cheaper than a cache lookup at the usual horizons: cached on request only (use_cache=True)
+    @cached('simulate_process', SIMULATOR_VERSION, enabled=False)
+    def simulate_process(self, parameters, duration=3600, dt=60, solver='auto', precision='float64',
+                         tolerance=None):
         """
         Simulate industrial process
-        parameters: dict containing process parameters
+        parameters: dict containing process parameters ('temperature' is the
+            initial temperature and, unless 'setpoint' is given, the setpoint
+            the KPIs are scored against; flow rate in m³/h)
         duration: simulation duration in seconds
         dt: time step in seconds
+        solver: 'analytical' (exact solution), 'odeint', or 'auto' (analytical
+            unless energy_balance has been overridden)
+        precision: 'float64' or 'float32' storage of the time and temperature arrays
+        tolerance: when set, only the points where the temperature moves by
+            tolerance (°C) are stored (see decimate_trajectory)
         """
         # Extract parameters
-        T_initial = parameters.get('temperature', 150)
-        Q_in = parameters.get('heat_input', 1000)
-        T_in = parameters.get('inlet_temperature', 25)
-        flow_rate = parameters.get('flow_rate', 100)
+        T_initial = parameters.get('temperature', DEFAULT_PARAMETERS['temperature'])
+        Q_in = parameters.get('heat_input', DEFAULT_PARAMETERS['heat_input'])
+        T_in = parameters.get('inlet_temperature', DEFAULT_PARAMETERS['inlet_temperature'])
+        flow_rate = parameters.get('flow_rate', DEFAULT_PARAMETERS['flow_rate'])
         
         # Time points
         t = np.linspace(0, duration, int(duration/dt))
         
-        # Solve ODE
-        T = odeint(self.energy_balance, T_initial, t, args=(Q_in, T_in, flow_rate))
+        if solver == 'auto':
+            solver = 'analytical' if self.has_linear_energy_balance() else 'odeint'
+
+        if solver == 'analytical':
+            T = self.analytical_temperature(t, T_initial, Q_in, T_in, flow_rate)
+        elif solver == 'odeint':
+            # Solve ODE
+            T = odeint(self.energy_balance, T_initial, t, args=(Q_in, T_in, flow_rate))
+        else:
+            raise ValueError(f"Unknown solver '{solver}'")
+        # (n, 1) odeint output: ravel returns a view, no copy
+        T = np.ravel(T)
+
+        if tolerance is not None and len(T):
+            keep, _ = decimate_trajectory(T, tolerance, T[0])
+            keep[-1] = True
+            t, T = t[keep], T[keep]
         
         # Calculate other process variables
         energy_consumption = Q_in * duration / 3600  # kWh
         product_output = flow_rate * duration / 3600  # m³
         
         return {
-            'time': t,
-            'temperature': T.flatten(),
+            'time': t.astype(precision, copy=False),
+            'temperature': T.astype(precision, copy=False),
             'energy_consumption': energy_consumption,
-            'product_output': product_output
+            'product_output': product_output,
+            'setpoint': parameters.get('setpoint', T_initial),
+            'decimated': tolerance is not None
         }
+
+    def iter_simulation(self, parameters, duration=3600, dt=60, solver='auto', precision='float32',
+                        tolerance=None, chunk_points=10080):
+        """
+        Simulate in segments of chunk_points time steps (one week at dt=60)
+        Same time grid and parameters as simulate_process, but the trajectory is
+        never materialized: every segment is computed, decimated and converted
+        to the requested precision before being yielded as a dict of 'time' and
+        'temperature' arrays, the last one also carrying the energy consumption,
+        product output and setpoint.
+        chunk_points: time steps per segment
+        """
+        T_initial = parameters.get('temperature', DEFAULT_PARAMETERS['temperature'])
+        Q_in = parameters.get('heat_input', DEFAULT_PARAMETERS['heat_input'])
+        T_in = parameters.get('inlet_temperature', DEFAULT_PARAMETERS['inlet_temperature'])
+        flow_rate = parameters.get('flow_rate', DEFAULT_PARAMETERS['flow_rate'])
+
+        n = int(duration/dt)
+        step = duration / (n - 1) if n > 1 else 0.0
+
+        if solver == 'auto':
+            solver = 'analytical' if self.has_linear_energy_balance() else 'odeint'
+        if solver not in ('analytical', 'odeint'):
+            raise ValueError(f"Unknown solver '{solver}'")
+
+        last_time, last_temperature, level = 0.0, float(T_initial), None
+        for start in range(0, n, chunk_points):
+            stop = min(n, start + chunk_points)
+            t = np.arange(start, stop) * step
+            if stop == n:
+                t[-1] = duration
+
+            if solver == 'analytical':
+                T = self.analytical_temperature(t, T_initial, Q_in, T_in, flow_rate)
+            elif start == 0:
+                T = odeint(self.energy_balance, T_initial, t, args=(Q_in, T_in, flow_rate))[:, 0]
+            else:
+                # Continue from the end of the previous segment
+                T = odeint(self.energy_balance, last_temperature, np.concatenate([[last_time], t]),
+                           args=(Q_in, T_in, flow_rate))[1:, 0]
+            last_time, last_temperature = t[-1], T[-1]
+
+            segment = {}
+            if tolerance is not None:
+                keep, level = decimate_trajectory(T, tolerance, T_initial, level)
+                if stop == n:
+                    keep[-1] = True
+                t, T = t[keep], T[keep]
+            segment['time'] = t.astype(precision, copy=False)
+            segment['temperature'] = T.astype(precision, copy=False)
+            if stop == n:
+                segment['energy_consumption'] = Q_in * duration / 3600  # kWh
+                segment['product_output'] = flow_rate * duration / 3600  # m³
+                segment['setpoint'] = parameters.get('setpoint', T_initial)
+            yield segment
     
-    def predict_kpis(self, simulation_results):
-        """Predict KPIs based on simulation results"""
+    def simulate_batch(self, temperature=150, heat_input=1000, inlet_temperature=25, flow_rate=100,
+                       duration=3600, dt=60, solver='auto', setpoint=None):
+        """
+        Simulate many scenarios at once
+        temperature, heat_input, inlet_temperature, flow_rate: scalars or 1-D arrays
+            (broadcast together, one value per scenario)
+        setpoint: scalar or 1-D array, the initial temperature when None
+        Returns the time grid, a (scenarios x time) temperature array and the
+        per-scenario energy consumption, product output and setpoint.
+        """
+        T_initial, Q_in, T_in, flow, T_set = (
+            np.asarray(a, dtype=np.float64).ravel()
+            for a in np.broadcast_arrays(temperature, heat_input, inlet_temperature, flow_rate,
+                                         temperature if setpoint is None else setpoint)
+        )
+        t = np.linspace(0, duration, int(duration/dt))
+
+        if solver == 'auto':
+            solver = 'analytical' if self.has_linear_energy_balance() else 'odeint'
+
+        if solver == 'analytical':
+            T = self.analytical_temperature(t[None, :], T_initial[:, None], Q_in[:, None],
+                                            T_in[:, None], flow[:, None])
+        elif solver == 'odeint':
+            # All scenarios form one state vector; they are independent, so the
+            # Jacobian is diagonal (banded with ml=mu=0) and the cost stays linear
+            T = odeint(self.energy_balance, T_initial, t, args=(Q_in, T_in, flow), ml=0, mu=0).T
+        else:
+            raise ValueError(f"Unknown solver '{solver}'")
+
+        return {
+            'time': t,
+            'temperature': T,
+            'energy_consumption': Q_in * duration / 3600,  # kWh
+            'product_output': flow * duration / 3600,  # m³
+            'setpoint': T_set
+        }
+
+    def reset(self, temperature=150, heat_input=1000, inlet_temperature=25, flow_rate=100, time=0.0,
+              buffer_size=3600):
+        """
+        Initialize the real-time stepping mode
+        Values may be arrays to step several units together (one element per unit).
+        buffer_size: number of steps kept in the trajectory buffer
+        """
+        self.state = {
+            'time': float(time),
+            'temperature': np.array(temperature, dtype=np.float64),
+            'heat_input': np.array(heat_input, dtype=np.float64),
+            'inlet_temperature': np.array(inlet_temperature, dtype=np.float64),
+            'flow_rate': np.array(flow_rate, dtype=np.float64)
+        }
+        self.history = deque([(self.state['time'], self.state['temperature'].copy())], maxlen=buffer_size)
+
+    def step(self, dt, inputs=None):
+        """
+        Advance the current state by dt seconds and return the new temperature
+        inputs: optional dict of measured 'heat_input', 'inlet_temperature' and
+            'flow_rate', held constant over the step
+        """
+        if self.state is None:
+            self.reset()
+        state = self.state
+        if inputs:
+            for name in ('heat_input', 'inlet_temperature', 'flow_rate'):
+                if name in inputs:
+                    state[name] = np.asarray(inputs[name], dtype=np.float64)
+
+        if self.has_linear_energy_balance():
+            T = self.analytical_temperature(dt, state['temperature'], state['heat_input'],
+                                            state['inlet_temperature'], state['flow_rate'])
+        else:
+            T0 = np.atleast_1d(state['temperature'])
+            T = odeint(self.energy_balance, T0, [0.0, dt],
+                       args=(state['heat_input'], state['inlet_temperature'], state['flow_rate']),
+                       ml=0, mu=0)[-1].reshape(np.shape(state['temperature']))
+
+        state['temperature'] = np.asarray(T, dtype=np.float64)
+        state['time'] += dt
+        self.history.append((state['time'], state['temperature'].copy()))
+        return state['temperature']
+
+    def trajectory(self):
+        """Time and temperature arrays of the steps kept in the buffer"""
+        if not self.history:
+            return np.empty(0), np.empty(0)
+        times, temperatures = zip(*self.history)
+        return np.array(times), np.array(temperatures)
+
+    def snapshot(self):
+        """Copy of the stepping state and trajectory buffer"""
         return {
-            'energy_efficiency': min(100, 85 + np.random.normal(0, 5)),
-            'product_quality': min(100, 90 + np.random.normal(0, 3)),
-            'yield_rate': min(100, 88 + np.random.normal(0, 4)),
-            'cost_per_unit': 100 + np.random.normal(0, 10)
+            'state': {name: np.copy(value) if isinstance(value, np.ndarray) else value
+                      for name, value in self.state.items()},
+            'history': list(self.history),
+            'buffer_size': self.history.maxlen
         }
+
+    def restore(self, snapshot):
+        """Return to a state saved by snapshot()"""
+        self.state = {name: np.copy(value) if isinstance(value, np.ndarray) else value
+                      for name, value in snapshot['state'].items()}
+        self.history = deque(snapshot['history'], maxlen=snapshot['buffer_size'])
+
+    def predict_kpis(self, simulation_results):
+        """Predict KPIs based on simulation results (see process_kpis)"""
+        kpis = process_kpis(simulation_results['temperature'], simulation_results['energy_consumption'],
+                            simulation_results['product_output'], simulation_results['setpoint'],
+                            simulation_results['time'])
+        return {name: float(value) for name, value in kpis.items()}
@@ -0,0 +1,172 @@
+import itertools
+import numpy as np
+from utils.simulation import DEFAULT_PARAMETERS, ProcessSimulator, PROCESS_KPIS, process_kpis
+
+# Parameter space covered by the surrogate (ranges of the digital twin inputs)
+SURROGATE_BOUNDS = {
+    'temperature': (100, 200),
+    'heat_input': (500, 2000),
+    'inlet_temperature': (20, 50),
+    'flow_rate': (50, 150)
+}
+
+# Largest cross-validated RMSE accepted for each KPI before falling back to the simulation
+SURROGATE_TOLERANCES = {
+    'energy_efficiency': 0.5,  # %
+    'product_quality': 1.0,  # %
+    'yield_rate': 1.0,  # %
+    'cost_per_unit': 0.05  # €/m³
+}
+
+def latin_hypercube(n, d, rng):
+    """n points of a Latin hypercube in [0, 1]^d: one point per stratum along every axis"""
+    strata = np.argsort(rng.random((d, n)), axis=1).T
+    return (strata + rng.random((n, d))) / n
+
+def polynomial_exponents(d, degree):
+    """Exponents (terms x d) of every monomial of total degree <= degree"""
+    return np.array([powers for powers in itertools.product(range(degree + 1), repeat=d)
+                     if sum(powers) <= degree])
+
+class KPISurrogate:
+    """
+    Polynomial surrogate of the simulated KPIs
+    The simulator is sampled over SURROGATE_BOUNDS with a Latin hypercube and
+    every KPI of process_kpis is fitted by (ridge) least squares on the
+    monomials of the scaled parameters. The k-fold cross-validated RMSE of each
+    KPI decides whether predictions can be trusted; otherwise, and outside the
+    bounds, predict_kpis falls back to the full simulation.
+
+    bounds: dict of parameter -> (low, high)
+    duration, dt: simulation horizon the surrogate stands for
+    degree: total degree of the polynomial
+    n_samples, n_folds: training simulations and cross-validation folds
+    tolerances: dict of KPI -> largest accepted cross-validated RMSE
+    """
+
+    def __init__(self, simulator=None, bounds=None, duration=3600, dt=60, degree=3, n_samples=512,
+                 n_folds=5, ridge=1e-8, tolerances=None, seed=0):
+        self.simulator = simulator or ProcessSimulator()
+        self.bounds = bounds or SURROGATE_BOUNDS
+        self.parameters = tuple(self.bounds)
+        self.duration = duration
+        self.dt = dt
+        self.degree = degree
+        self.n_samples = n_samples
+        self.n_folds = n_folds
+        self.ridge = ridge
+        self.tolerances = tolerances or SURROGATE_TOLERANCES
+        self.seed = seed
+
+        low, high = np.array([self.bounds[name] for name in self.parameters], dtype=np.float64).T
+        self.center = (high + low) / 2
+        self.half_range = (high - low) / 2
+        self.exponents = polynomial_exponents(len(self.parameters), degree)
+        self.coefficients = None
+        self.cv_error = None
+        self.is_trusted = False
+        self.stats = {'surrogate': 0, 'simulation': 0}
+
+    def _simulate(self, X):
+        """Exact KPIs (n x kpis) of the parameter rows of X"""
+        results = self.simulator.simulate_batch(**dict(zip(self.parameters, X.T)),
+                                                duration=self.duration, dt=self.dt)
+        kpis = process_kpis(results['temperature'], results['energy_consumption'], results['product_output'],
+                            results['setpoint'], results['time'])
+        return np.column_stack([kpis[name] for name in PROCESS_KPIS])
+
+    def _features(self, X):
+        """Monomials (n x terms) of the parameters scaled to [-1, 1]"""
+        scaled = (X - self.center) / self.half_range
+        powers = np.arange(self.degree + 1)
+        if len(X) < 256:
+            # Few rows: one gather of the powers of every parameter (fewest numpy calls)
+            return (scaled[:, :, None] ** powers)[:, np.arange(X.shape[1]), self.exponents].prod(axis=2)
+        features = np.ones((len(X), len(self.exponents)))
+        for j in range(X.shape[1]):
+            # Powers of one parameter, then picked by the exponent of every term
+            features *= (scaled[:, j:j + 1] ** powers)[:, self.exponents[:, j]]
+        return features
+
+    def _solve(self, features, targets):
+        gram = features.T @ features
+        gram[np.diag_indices_from(gram)] += self.ridge * len(features)
+        return np.linalg.solve(gram, features.T @ targets)
+
+    def fit(self):
+        """Sample the simulator, cross-validate and fit the surrogate; returns the CV RMSE per KPI"""
+        rng = np.random.default_rng(self.seed)
+        unit = latin_hypercube(self.n_samples, len(self.parameters), rng)
+        X = self.center - self.half_range + 2 * self.half_range * unit
+        Y = self._simulate(X)
+        features = self._features(X)
+
+        folds = np.arange(self.n_samples) % self.n_folds
+        rng.shuffle(folds)
+        squared_error = np.zeros(Y.shape[1])
+        for k in range(self.n_folds):
+            test = folds == k
+            coefficients = self._solve(features[~test], Y[~test])
+            squared_error += ((features[test] @ coefficients - Y[test])**2).sum(axis=0)
+
+        self.coefficients = self._solve(features, Y)
+        self.cv_error = dict(zip(PROCESS_KPIS, np.sqrt(squared_error / self.n_samples)))
+        self.is_trusted = self.trusted()
+        return self.cv_error
+
+    def _as_array(self, parameters):
+        """(n x parameters) array from a dict of scalars or arrays"""
+        values = [parameters.get(name, DEFAULT_PARAMETERS[name]) for name in self.parameters]
+        if all(np.isscalar(value) for value in values):
+            return np.array([values], dtype=np.float64)
+        columns = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in values])
+        return np.column_stack([np.ravel(column) for column in columns])
+
+    def trusted(self):
+        """True when every KPI meets its tolerance"""
+        return self.cv_error is not None and all(
+            self.cv_error[name] <= self.tolerances.get(name, np.inf) for name in PROCESS_KPIS
+        )
+
+    def predict_batch(self, parameters, fallback=True):
+        """
+        KPIs of many parameter sets at once
+        parameters: dict of parameter -> scalar or 1-D array (missing ones take
+            the simulate_process defaults)
+        Rows outside the bounds, or all rows when the surrogate is not trusted,
+        are simulated instead when fallback is True.
+        Returns a dict of KPI -> array.
+        """
+        if self.coefficients is None:
+            self.fit()
+        X = self._as_array(parameters)
+        Y = self._features(X) @ self.coefficients
+
+        if fallback:
+            if self.is_trusted:
+                outside = (np.abs(X - self.center) > self.half_range).any(axis=1)
+            else:
+                outside = np.ones(len(X), dtype=bool)
+            n_outside = int(np.count_nonzero(outside))
+            if n_outside:
+                Y[outside] = self._simulate(X[outside])
+            self.stats['simulation'] += n_outside
+            self.stats['surrogate'] += len(X) - n_outside
+        return dict(zip(PROCESS_KPIS, Y.T))
+
+    def predict_kpis(self, parameters, fallback=True):
+        """KPIs of one parameter set, as ProcessSimulator.predict_kpis returns them"""
+        if self.coefficients is None:
+            self.fit()
+        X = np.array([[parameters.get(name, DEFAULT_PARAMETERS[name]) for name in self.parameters]],
+                     dtype=np.float64)
+        if fallback and not (self.is_trusted and (np.abs(X - self.center) <= self.half_range).all()):
+            self.stats['simulation'] += 1
+            values = self._simulate(X)[0]
+        else:
+            self.stats['surrogate'] += 1
+            values = (self._features(X) @ self.coefficients)[0]
+        return dict(zip(PROCESS_KPIS, values.tolist()))
+
+# Process-wide surrogate shared by the pages (fitted on first use)
+KPI_SURROGATE = KPISurrogate()
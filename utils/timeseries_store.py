@@ -0,0 +1,217 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from urllib.parse import quote, unquote
+
+# Partition granularities: (directory name format, pandas period frequency)
+PARTITIONS = {
+    'day': ('%Y-%m-%d', 'D'),
+    'month': ('%Y-%m', 'M')
+}
+
+class TimeSeriesStore:
+    """
+    Local columnar store for sensor readings and KPIs
+    Layout: root/<dataset>/<unit>/<partition>/<segment>/<column>.npy
+    Each append writes a new segment per partition (day or month); columns are
+    plain .npy files read back with memory mapping, and reads only open the
+    partitions in range. Segment names are unique (write time and a random
+    suffix), so concurrent writers never collide; a partition holding more than
+    max_segments segments is compacted by the append that exceeds it. Segments
+    are published with a rename once complete, and compaction only removes the
+    merged segments after publishing their replacement. Without a root the
+    store lives in a temporary directory removed at exit.
+    """
+
+    def __init__(self, root=None, partition='day', max_segments=8):
+        self.owns_root = root is None
+        self.root = tempfile.mkdtemp(prefix='history-') if root is None else str(root)
+        self.partition_format, self.partition_freq = PARTITIONS[partition]
+        self.max_segments = max_segments
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        if self.owns_root:
+            atexit.register(self.close)
+
+    def close(self):
+        """Delete the store directory when the store created it"""
+        if self.owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def lock(self, unit, dataset='readings'):
+        """Re-entrant lock serializing the readers and writers of a unit within this process"""
+        with self.locks_lock:
+            return self.locks.setdefault((dataset, str(unit)), threading.RLock())
+
+    def _unit_dir(self, unit, dataset):
+        return os.path.join(self.root, dataset, quote(str(unit), safe=''))
+
+    def units(self, dataset='readings'):
+        """List the units stored for a dataset"""
+        path = os.path.join(self.root, dataset)
+        if not os.path.isdir(path):
+            return []
+        return sorted(unquote(name) for name in os.listdir(path))
+
+    def partitions(self, unit, dataset='readings'):
+        """List the partitions of a unit"""
+        path = self._unit_dir(unit, dataset)
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.listdir(path))
+
+    def append(self, unit, frame, dataset='readings'):
+        """
+        Append a DataFrame indexed by timestamp (or with a 'timestamp' column)
+        Rows are split by partition and written as a new segment in each of them.
+        """
+        if 'timestamp' in frame.columns:
+            frame = frame.set_index('timestamp')
+        if frame.empty:
+            return
+        frame = frame.sort_index()
+        timestamps = pd.DatetimeIndex(frame.index).as_unit('ns').asi8
+        keys = pd.DatetimeIndex(frame.index).to_period(self.partition_freq).asi8
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+
+        with self.lock(unit, dataset):
+            for rows in np.split(np.arange(len(frame)), boundaries):
+                partition = frame.index[rows[0]].strftime(self.partition_format)
+                partition_dir = os.path.join(self._unit_dir(unit, dataset), partition)
+                os.makedirs(partition_dir, exist_ok=True)
+                self._write_segment(partition_dir, timestamps[rows], frame.iloc[rows])
+
+                segments = [name for name in os.listdir(partition_dir) if not name.startswith('.')]
+                if len(segments) > self.max_segments:
+                    self.compact(unit, dataset, partition)
+
+    def _write_segment(self, partition_dir, timestamps, frame):
+        """Write the rows of a frame as a new segment of a partition; returns its name"""
+        # Ordered by write time, unique across threads and processes
+        segment = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        # Write to a temporary directory first so readers never see partial segments
+        tmp_dir = os.path.join(partition_dir, f".{segment}.tmp")
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, 'timestamp.npy'), timestamps)
+        np.save(os.path.join(tmp_dir, 'columns.npy'), np.array([str(column) for column in frame.columns]))
+        for column in frame.columns:
+            np.save(os.path.join(tmp_dir, f"{quote(str(column), safe='')}.npy"), frame[column].to_numpy())
+        os.replace(tmp_dir, os.path.join(partition_dir, segment))
+        return segment
+
+    def _segments(self, unit, dataset, start, end):
+        """Yield the segment directories of the partitions overlapping [start, end)"""
+        first_partition = None if start is None else pd.Timestamp(start).strftime(self.partition_format)
+        last_partition = None if end is None else pd.Timestamp(end).strftime(self.partition_format)
+        unit_dir = self._unit_dir(unit, dataset)
+        for partition in self.partitions(unit, dataset):
+            if (first_partition is not None and partition < first_partition) or (last_partition is not None and partition > last_partition):
+                continue
+            partition_dir = os.path.join(unit_dir, partition)
+            for segment in sorted(os.listdir(partition_dir)):
+                if not segment.startswith('.'):
+                    yield os.path.join(partition_dir, segment)
+
+    def read(self, unit, start=None, end=None, columns=None, dataset='readings'):
+        """
+        Read the rows of a unit with start <= timestamp < end
+        columns: subset of columns to load (all when None)
+        Returns a DataFrame indexed by timestamp.
+        """
+        with self.lock(unit, dataset):
+            return self._read(unit, start, end, columns, dataset)
+
+    def _read(self, unit, start, end, columns, dataset):
+        start_ns = None if start is None else pd.Timestamp(start).as_unit('ns').value
+        end_ns = None if end is None else pd.Timestamp(end).as_unit('ns').value
+        pieces = {}
+        index = []
+
+        for segment_dir in self._segments(unit, dataset, start, end):
+            timestamps = np.load(os.path.join(segment_dir, 'timestamp.npy'), mmap_mode='r')
+            lo = 0 if start_ns is None else np.searchsorted(timestamps, start_ns, 'left')
+            hi = len(timestamps) if end_ns is None else np.searchsorted(timestamps, end_ns, 'left')
+            if hi <= lo:
+                continue
+            index.append(timestamps[lo:hi])
+            names = columns
+            if names is None:
+                names = np.load(os.path.join(segment_dir, 'columns.npy')).tolist()
+            for name in names:
+                values = np.load(os.path.join(segment_dir, f"{quote(str(name), safe='')}.npy"), mmap_mode='r')
+                pieces.setdefault(name, []).append(values[lo:hi])
+
+        if not index:
+            return pd.DataFrame(columns=columns or [], index=pd.DatetimeIndex([], name='timestamp'))
+
+        frame = pd.DataFrame(
+            {name: np.concatenate(values) for name, values in pieces.items()},
+            index=pd.DatetimeIndex(np.concatenate(index).view('datetime64[ns]'), name='timestamp')
+        )
+        # Segments of a partition may overlap in time; a timestamp written
+        # twice keeps its latest segment
+        if len(index) > 1:
+            if not frame.index.is_monotonic_increasing:
+                frame = frame.sort_index(kind='stable')
+            duplicated = frame.index.duplicated(keep='last')
+            if duplicated.any():
+                frame = frame[~duplicated]
+        return frame
+
+    def compact(self, unit, dataset='readings', partition=None):
+        """Merge the segments of each partition (or of one partition) into a single segment"""
+        with self.lock(unit, dataset):
+            for partition in ([partition] if partition is not None else self.partitions(unit, dataset)):
+                partition_dir = os.path.join(self._unit_dir(unit, dataset), partition)
+                segments = [name for name in sorted(os.listdir(partition_dir)) if not name.startswith('.')]
+                if len(segments) < 2:
+                    continue
+                period = pd.Period(partition, self.partition_freq)
+                frame = self.read(unit, period.start_time, (period + 1).start_time, dataset=dataset)
+                # Publish the merged segment before removing the merged ones: a
+                # reader or a crash in between sees duplicated rows (the read
+                # keeps one of each), never missing ones
+                self._write_segment(partition_dir, pd.DatetimeIndex(frame.index).as_unit('ns').asi8, frame)
+                for segment in segments:
+                    # Hidden first, so that listings skip a partially deleted segment
+                    hidden = os.path.join(partition_dir, f".{segment}.old")
+                    os.replace(os.path.join(partition_dir, segment), hidden)
+                    shutil.rmtree(hidden)
+
+    def delete(self, unit, dataset='readings'):
+        """Remove every partition of a unit"""
+        shutil.rmtree(self._unit_dir(unit, dataset), ignore_errors=True)
+
+def load_history(store, unit, days=30, freq='h', generator=None):
+    """
+    Load the last `days` of readings of a unit from the store
+    Missing history before the first stored reading, and after the last one,
+    is produced by `generator(start, end, freq)` and appended to the store.
+    """
+    if generator is None:
+        from utils.data_generator import generate_historical_frame
+
+        def generator(start, end, freq):
+            return generate_historical_frame(start=start, end=end, freq=freq)
+
+    step = pd.tseries.frequencies.to_offset(freq)
+    end = pd.Timestamp.now().floor(step)
+    start = end - pd.Timedelta(days=days)
+
+    # Concurrent sessions would otherwise all generate the same missing rows
+    with store.lock(unit):
+        frame = store.read(unit, start, end)
+        if frame.empty:
+            store.append(unit, generator(start, end, freq))
+        else:
+            if frame.index[0] - start >= pd.Timedelta(step):
+                store.append(unit, generator(start, frame.index[0], freq))
+            if end - frame.index[-1] > pd.Timedelta(step):
+                store.append(unit, generator(frame.index[-1] + pd.Timedelta(step), end, freq))
+        return store.read(unit, start, end)